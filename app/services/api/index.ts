@@ -507,9 +507,10 @@ export class Api {
   }
 
   async getHeatmapData(): Promise<ApiResult<HeatmapDataResponse>> {
+    // also includes archived readings (daily average per grid cell), which posts_ruido/ omits
     return this.request<HeatmapDataResponse>({
       method: "get",
-      url: "posts_ruido/",
+      url: "posts_ruido/mapa_calor/",
     })
   }
 
@@ -0,0 +1,81 @@
+"""Versões assíncronas (ASGI) das leituras pesadas do mapa.
+
+São views Django puras porque o DRF não roda views ``async``. Todas leem da
+réplica quando houver uma e devolvem o JSON em streaming direto do cursor.
+"""
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.views.decorators.http import require_GET
+
+from .db_router import banco_de_leitura
+from .models import LeituraRuidoAgregada, PostAreaVerde, PostRuido, User
+from .streaming import (
+    CAMPOS_AREA_VERDE,
+    CAMPOS_PONTO_AGREGADO,
+    CAMPOS_PONTO_CALOR,
+    CAMPOS_USUARIO,
+    area_verde_para_dict,
+    json_array_async,
+    ponto_agregado,
+    ponto_calor_para_dict,
+    usuario_para_dict,
+)
+
+# Nos querysets abaixo o values_list usa named=True de propósito: o iterável de
+# tuplas simples executa a query já no __iter__, fora da thread do aiterator(),
+# e o Django acusa SynchronousOnlyOperation. As namedtuples desempacotam igual.
+
+
+async def _pontos_calor(banco):
+    leituras = PostRuido.objects.using(banco).values_list(*CAMPOS_PONTO_CALOR, named=True)
+    async for linha in leituras.aiterator(chunk_size=settings.STREAMING_CHUNK_SIZE):
+        yield linha
+
+    agregadas = LeituraRuidoAgregada.objects.using(banco).values_list(*CAMPOS_PONTO_AGREGADO, named=True)
+    async for linha in agregadas.aiterator(chunk_size=settings.STREAMING_CHUNK_SIZE):
+        yield ponto_agregado(linha)
+
+
+async def _objeto_com_pontos(banco):
+    yield b'{"points":'
+    async for pedaco in json_array_async(_pontos_calor(banco), ponto_calor_para_dict):
+        yield pedaco
+    yield b"}"
+
+
+@require_GET
+async def mapa_calor(request):
+    banco = banco_de_leitura(PostRuido)
+    return StreamingHttpResponse(_objeto_com_pontos(banco), content_type="application/json")
+
+
+@require_GET
+async def areas_verdes(request):
+    qs = (
+        PostAreaVerde.objects.using(banco_de_leitura(PostAreaVerde))
+        .values_list(*CAMPOS_AREA_VERDE, named=True)
+    )
+    total = await qs.acount()
+    resposta = StreamingHttpResponse(
+        json_array_async(qs.aiterator(chunk_size=settings.STREAMING_CHUNK_SIZE), area_verde_para_dict),
+        content_type="application/json",
+    )
+    resposta["X-Total-Count"] = str(total)
+    return resposta
+
+
+@require_GET
+async def ranking(request):
+    qs = (
+        User.objects.using(banco_de_leitura(User))
+        .order_by("-streak")
+        .values_list(*CAMPOS_USUARIO, named=True)
+    )
+    total = await qs.acount()
+    resposta = StreamingHttpResponse(
+        json_array_async(qs.aiterator(chunk_size=settings.STREAMING_CHUNK_SIZE), usuario_para_dict),
+        content_type="application/json",
+    )
+    resposta["X-Total-Count"] = str(total)
+    return resposta
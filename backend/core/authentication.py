@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .db_router import leitura_na_replica
+
+
+def _chave_usuario(user_id) -> str:
+    return f"jwt_usuario:{user_id}"
+
+
+def invalidar_usuario_cache(user_id) -> None:
+    """Chamar sempre que o usuário mudar sem passar por ``save()`` (ex.: ``QuerySet.update``)."""
+
+    cache.delete(_chave_usuario(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` que guarda o usuário no cache por alguns segundos.
+
+    Evita o SELECT do usuário em toda request autenticada. O cache é limpo quando
+    o usuário é salvo (ver ``core.signals``), e as mesmas checagens do simplejwt
+    (usuário ativo, senha trocada) continuam valendo pro objeto em cache.
+
+    Com ``JWT_USUARIO_CACHE_TTL = 0`` (o padrão sem um CACHE_URL compartilhado)
+    o cache fica desligado: em memória, a invalidação só chegaria na instância
+    que fez a escrita.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        if settings.JWT_USUARIO_CACHE_TTL <= 0:
+            return self._buscar_usuario(validated_token)
+
+        chave = _chave_usuario(user_id)
+        user = cache.get(chave)
+        if user is None:
+            user = self._buscar_usuario(validated_token)
+            cache.set(chave, user, settings.JWT_USUARIO_CACHE_TTL)
+            return user
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
+
+    def _buscar_usuario(self, validated_token):
+        # sempre do primário: o usuário vai pro cache e é usado nas escritas da request
+        with leitura_na_replica(False):
+            return super().get_user(validated_token)
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches)
+def cache_compartilhado(app_configs, **kwargs):
+    """Em produção os token buckets (e os outros caches) precisam de um cache compartilhado."""
+
+    if settings.DEBUG or settings.CACHE_COMPARTILHADO:
+        return []
+    return [
+        Warning(
+            "O cache padrão é em memória, então cada instância tem os próprios baldes de "
+            "limite de escrita: o limite real cresce com o número de instâncias.",
+            hint="Aponte CACHE_URL pra um Redis/Memcached compartilhado, ex.: redis://host:6379/0.",
+            id="core.W001",
+        )
+    ]
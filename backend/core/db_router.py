@@ -0,0 +1,63 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connections, router
+
+REPLICA = "replica"
+
+# Ligado só durante as ações de leitura marcadas nas views (ver LeituraReplicaMixin)
+_usar_replica: ContextVar[bool] = ContextVar("usar_replica", default=False)
+
+
+@contextmanager
+def leitura_na_replica(ligada: bool = True):
+    """Liga (ou, com ``ligada=False``, desliga) as leituras na réplica dentro do bloco."""
+
+    token = _usar_replica.set(ligada)
+    try:
+        yield
+    finally:
+        _usar_replica.reset(token)
+
+
+def replica_ativa() -> bool:
+    return _usar_replica.get()
+
+
+def banco_de_leitura(model) -> str:
+    """Alias que uma leitura de ``model`` usaria dentro de ``leitura_na_replica``.
+
+    Respostas em streaming são consumidas depois que a view retorna, então o
+    queryset precisa ser fixado no banco certo com ``.using()`` antes disso.
+    """
+
+    with leitura_na_replica():
+        return router.db_for_read(model)
+
+
+class ReplicaRouter:
+    """Manda leituras pra réplica quando a view pediu; o resto fica no primário.
+
+    Escritas, ``select_for_update`` e qualquer coisa dentro de ``transaction.atomic``
+    continuam no ``default``, então não tem risco de ler um dado atrasado no meio
+    de uma compra ou de um post.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not _usar_replica.get() or REPLICA not in connections.databases:
+            return "default"
+        if connections["default"].in_atomic_block:
+            return "default"
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        bancos = {"default", REPLICA}
+        if obj1._state.db in bancos and obj2._state.db in bancos:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
@@ -0,0 +1,151 @@
+import os
+from collections import defaultdict
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from core.models import LeituraRuidoAgregada, Post
+from core.services.exportacao import (
+    COLUNAS_LEITURA_RUIDO,
+    FORMATOS_ARQUIVO,
+    abrir_escritor,
+    extensao,
+    iterar_em_lotes,
+)
+from core.services.geo import celula
+
+# as mesmas colunas buscadas a partir do Post (que também apaga os posts comuns, com os
+# campos de ruído nulos): o que não é do Post vem pelo postruido__
+_CAMPOS_DO_POST = {campo.attname for campo in Post._meta.concrete_fields}
+CAMPOS_BANCO = tuple(
+    nome if nome in _CAMPOS_DO_POST else f"postruido__{nome}" for nome, _ in COLUNAS_LEITURA_RUIDO
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Arquiva em disco (Parquet ou CSV gzip) as leituras mais antigas que a janela de retenção, "
+        "apaga elas do banco em lotes e guarda um resumo diário por célula pro mapa de calor histórico."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dias", type=int, default=settings.ARQUIVO_RETENCAO_DIAS,
+                            help="Mantém no banco só as leituras dos últimos N dias.")
+        parser.add_argument("--destino", default=settings.ARQUIVO_LEITURAS_DIR,
+                            help="Diretório onde o arquivo vai ser escrito.")
+        parser.add_argument("--formato", choices=FORMATOS_ARQUIVO, default="csv",
+                            help="parquet precisa do pyarrow instalado.")
+        parser.add_argument("--lote", type=int, default=5000, help="Linhas por lote de escrita/remoção.")
+        parser.add_argument("--dry-run", action="store_true", help="Só conta o que seria arquivado.")
+
+    def handle(self, *args, **options):
+        dias = options["dias"]
+        # o streak depende do post de ontem, então nunca arquiva menos de dois dias
+        if dias < 2:
+            raise CommandError("--dias precisa ser pelo menos 2.")
+        lote = options["lote"]
+        if lote < 1:
+            raise CommandError("--lote precisa ser pelo menos 1.")
+
+        corte = timezone.localdate() - timedelta(days=dias)
+        antigos = Post.objects.filter(local_data__lt=corte)
+
+        if options["dry_run"]:
+            self.stdout.write(f"{antigos.count()} leituras anteriores a {corte} seriam arquivadas.")
+            return
+
+        destino = Path(options["destino"])
+        destino.mkdir(parents=True, exist_ok=True)
+        caminho = destino / (
+            f"leituras_ate_{corte:%Y%m%d}_{timezone.now():%Y%m%d%H%M%S}"
+            f"{extensao(options['formato'], comprimir=True)}"
+        )
+
+        # Primeiro o arquivo inteiro, com outro nome até estar fechado e no disco. Só depois
+        # de renomear é que apaga do banco, e só as linhas que foram pro arquivo (id <= ultimo_id):
+        # se cair no meio da remoção, o pior caso é linha repetida no próximo arquivo.
+        ultimo_id = self._escrever_arquivo(antigos, caminho, options["formato"], lote)
+        if ultimo_id is None:
+            self.stdout.write(f"Nenhuma leitura anterior a {corte}.")
+            return
+        self.stdout.write(f"Arquivo gravado em {caminho}, removendo as leituras do banco...")
+
+        total = 0
+        arquivadas = antigos.filter(id__lte=ultimo_id).order_by("id")
+        while linhas := list(arquivadas.values_list(*CAMPOS_BANCO)[:lote]):
+            with transaction.atomic():
+                self._agregar(linhas)
+                Post.objects.filter(pk__in=[linha[0] for linha in linhas]).delete()
+
+            total += len(linhas)
+            self.stdout.write(f"{total} leituras arquivadas...")
+
+        self.stdout.write(self.style.SUCCESS(f"{total} leituras arquivadas em {caminho}"))
+
+    def _escrever_arquivo(self, antigos, caminho, formato, lote):
+        """Grava as leituras em ``caminho`` e devolve o maior id escrito (``None`` se não tinha nenhuma)."""
+
+        parcial = caminho.with_name(caminho.name + ".parcial")
+        ultimo_id = None
+        try:
+            with open(parcial, "wb") as arquivo:
+                try:
+                    escritor = abrir_escritor(formato, arquivo, COLUNAS_LEITURA_RUIDO, comprimir=True)
+                except RuntimeError as exc:
+                    raise CommandError(str(exc)) from exc
+
+                linhas = antigos.order_by("id").values_list(*CAMPOS_BANCO)
+                for linhas_lote in iterar_em_lotes(linhas, lote):
+                    escritor.escrever(linhas_lote)
+                    ultimo_id = linhas_lote[-1][0]
+                escritor.fechar()
+
+                arquivo.flush()
+                os.fsync(arquivo.fileno())
+        except BaseException:
+            parcial.unlink(missing_ok=True)
+            raise
+
+        if ultimo_id is None:
+            parcial.unlink()
+            return None
+
+        os.replace(parcial, caminho)
+        # o rename só está garantido no disco depois do fsync do diretório
+        diretorio = os.open(caminho.parent, os.O_RDONLY)
+        try:
+            os.fsync(diretorio)
+        finally:
+            os.close(diretorio)
+        return ultimo_id
+
+    def _agregar(self, linhas):
+        grupos = defaultdict(lambda: [0, 0.0, None])
+        for _, _, latitude, longitude, dia, decibeis, decibeis_max, amostras in linhas:
+            if decibeis is None:  # Post comum, sem medição de ruído
+                continue
+            # leituras agrupadas guardam a média: volta pra soma pesando pelas amostras
+            grupo = grupos[(dia, *celula(latitude, longitude))]
+            grupo[0] += amostras
+            grupo[1] += decibeis * amostras
+            grupo[2] = decibeis_max if grupo[2] is None else max(grupo[2], decibeis_max)
+
+        for (dia, celula_lat, celula_lon), (amostras, soma, maximo) in grupos.items():
+            agregada, criada = LeituraRuidoAgregada.objects.get_or_create(
+                dia=dia,
+                celula_lat=celula_lat,
+                celula_lon=celula_lon,
+                defaults={"amostras": amostras, "soma_decibeis": soma, "max_decibeis": maximo},
+            )
+            if not criada:
+                LeituraRuidoAgregada.objects.filter(pk=agregada.pk).update(
+                    amostras=F("amostras") + amostras,
+                    soma_decibeis=F("soma_decibeis") + soma,
+                    max_decibeis=Greatest(F("max_decibeis"), maximo),
+                )
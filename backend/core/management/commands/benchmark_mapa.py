@@ -0,0 +1,67 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import URLError
+from urllib.request import urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+
+# (nome, caminho síncrono DRF, caminho async): os dois de cada par devolvem o mesmo JSON
+ENDPOINTS = [
+    ("mapa de calor", "/api/posts_ruido/mapa_calor/", "/api/async/mapa_calor/"),
+    ("áreas verdes", "/api/posts_areas/", "/api/async/posts_areas/"),
+    ("ranking", "/api/usuarios/ranking/", "/api/async/ranking/"),
+]
+
+
+def _baixar(url):
+    inicio = time.perf_counter()
+    with urlopen(url, timeout=60) as resposta:
+        while resposta.read(65536):
+            pass
+    return time.perf_counter() - inicio
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara latência e vazão das leituras do mapa entre o caminho WSGI (DRF) e as views async. "
+        "Suba os dois servidores antes, por exemplo: "
+        "`gunicorn -w 1 heatmapp_backend.wsgi -b :8000` e "
+        "`uvicorn heatmapp_backend.asgi:application --port 8001`."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--wsgi-url", default="http://127.0.0.1:8000")
+        parser.add_argument("--asgi-url", default="http://127.0.0.1:8001")
+        parser.add_argument("--concorrencia", type=int, default=50, help="Clientes simultâneos.")
+        parser.add_argument("--requisicoes", type=int, default=500, help="Total de requisições por endpoint.")
+
+    def handle(self, *args, **options):
+        concorrencia = options["concorrencia"]
+        requisicoes = options["requisicoes"]
+
+        for nome, caminho_sync, caminho_async in ENDPOINTS:
+            self.stdout.write(self.style.MIGRATE_HEADING(nome))
+            for rotulo, url in (
+                ("wsgi", options["wsgi_url"].rstrip("/") + caminho_sync),
+                ("asgi", options["asgi_url"].rstrip("/") + caminho_async),
+            ):
+                self._medir(rotulo, url, concorrencia, requisicoes)
+
+    def _medir(self, rotulo, url, concorrencia, requisicoes):
+        try:
+            _baixar(url)  # aquece conexões e caches antes de medir
+        except URLError as exc:
+            raise CommandError(f"Não consegui acessar {url}: {exc}") from exc
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+            tempos = sorted(executor.map(_baixar, [url] * requisicoes))
+        total = time.perf_counter() - inicio
+
+        p95 = tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))]
+        self.stdout.write(
+            f"  {rotulo}: {requisicoes / total:.1f} req/s | "
+            f"p50 {statistics.median(tempos) * 1000:.1f} ms | p95 {p95 * 1000:.1f} ms | "
+            f"máx {tempos[-1] * 1000:.1f} ms"
+        )
@@ -0,0 +1,67 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from core.services.exportacao import (
+    COLUNAS_LEITURA_RUIDO,
+    FORMATOS_EXPORTACAO,
+    abrir_escritor,
+    iterar_em_lotes,
+    leituras_ruido,
+)
+from core.services.geo import ler_bbox
+
+
+def _data(texto):
+    if texto is None:
+        return None
+    data = parse_date(texto)
+    if data is None:
+        raise CommandError(f"Data inválida: {texto} (use AAAA-MM-DD).")
+    return data
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporta as leituras de ruído (CSV, NDJSON ou Parquet) lendo o banco por cursor, "
+        "em lotes, com memória constante mesmo pra milhões de linhas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("saida", help="Arquivo de saída (use - pra escrever no stdout).")
+        parser.add_argument("--formato", choices=FORMATOS_EXPORTACAO, default="csv")
+        parser.add_argument("--gzip", action="store_true", help="Comprime a saída CSV/NDJSON com gzip.")
+        # valores separados (--bbox -47 -24 -46 -23): "-47,-24,..." o argparse confunde com uma opção
+        parser.add_argument("--bbox", nargs=4, type=float, metavar=("MIN_LON", "MIN_LAT", "MAX_LON", "MAX_LAT"))
+        parser.add_argument("--desde", help="Data inicial (AAAA-MM-DD), inclusiva.")
+        parser.add_argument("--ate", help="Data final (AAAA-MM-DD), inclusiva.")
+        parser.add_argument("--lote", type=int, default=None, help="Linhas por lote lido do cursor.")
+
+    def handle(self, *args, **options):
+        try:
+            bbox = ler_bbox(",".join(map(str, options["bbox"]))) if options["bbox"] else None
+        except ValueError as exc:
+            raise CommandError(str(exc)) from exc
+
+        leituras = leituras_ruido(bbox=bbox, desde=_data(options["desde"]), ate=_data(options["ate"]))
+
+        no_stdout = options["saida"] == "-"
+        arquivo = sys.stdout.buffer if no_stdout else open(options["saida"], "wb")
+        total = 0
+        try:
+            try:
+                escritor = abrir_escritor(options["formato"], arquivo, COLUNAS_LEITURA_RUIDO, options["gzip"])
+            except RuntimeError as exc:
+                raise CommandError(str(exc)) from exc
+
+            for lote in iterar_em_lotes(leituras, options["lote"]):
+                escritor.escrever(lote)
+                total += len(lote)
+            escritor.fechar()
+        finally:
+            if not no_stdout:
+                arquivo.close()
+
+        if not no_stdout:
+            self.stdout.write(self.style.SUCCESS(f"{total} leituras exportadas em {options['saida']}"))
@@ -0,0 +1,105 @@
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Roda num processo novo, como um cold start da função na Vercel: importa o wsgi
+# e atende uma request GET direto pela aplicação WSGI, sem servidor no meio.
+SCRIPT = """
+import json, os, sys, time
+inicio = time.perf_counter()
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "heatmapp_backend.settings")
+from heatmapp_backend.wsgi import application
+pronto = time.perf_counter()
+
+from wsgiref.util import setup_testing_defaults
+environ = {"REQUEST_METHOD": "GET", "PATH_INFO": sys.argv[1]}
+setup_testing_defaults(environ)
+status = []
+resposta = application(environ, lambda s, headers, exc_info=None: status.append(s))
+corpo = b"".join(resposta)
+getattr(resposta, "close", lambda: None)()
+fim = time.perf_counter()
+
+print(json.dumps({
+    "importacao": pronto - inicio,
+    "primeira_resposta": fim - inicio,
+    "status": status[0],
+    "bytes": len(corpo),
+}))
+"""
+
+
+def _ler_importtime(saida_erro):
+    """Linhas do ``-X importtime`` -> lista de (módulo, self_us, cumulativo_us)."""
+
+    modulos = []
+    for linha in saida_erro.splitlines():
+        if not linha.startswith("import time:") or "self [us]" in linha:
+            continue
+        _, proprio, cumulativo, nome = (
+            parte.strip() for parte in linha.replace("import time:", "|", 1).split("|")
+        )
+        modulos.append((nome, int(proprio), int(cumulativo)))
+    return modulos
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede o cold start do backend: tempo de import de cada módulo (python -X importtime) "
+        "e tempo até a primeira resposta, cada rodada num processo Python novo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--caminho", default="/api/", help="URL da primeira request.")
+        parser.add_argument("--repeticoes", type=int, default=3, help="Processos medidos (usa a mediana).")
+        parser.add_argument("--top", type=int, default=20, help="Quantos módulos mais lentos listar.")
+        parser.add_argument("--limite-ms", type=float, default=None,
+                            help="Falha se a mediana até a primeira resposta passar disso (pra CI).")
+
+    def handle(self, *args, **options):
+        rodadas = []
+        modulos = []
+        for _ in range(max(1, options["repeticoes"])):
+            inicio = time.perf_counter()
+            processo = subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", SCRIPT, options["caminho"]],
+                cwd=settings.BASE_DIR,
+                capture_output=True,
+                text=True,
+            )
+            total = time.perf_counter() - inicio
+            if processo.returncode != 0:
+                raise CommandError(f"O processo de medição falhou:\n{processo.stderr[-2000:]}")
+
+            resultado = json.loads(processo.stdout.strip().splitlines()[-1])
+            resultado["processo"] = total
+            rodadas.append(resultado)
+            if not modulos:
+                modulos = _ler_importtime(processo.stderr)
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Módulos mais lentos (cumulativo, top {options['top']})"))
+        for nome, proprio, cumulativo in sorted(modulos, key=lambda m: m[2], reverse=True)[:options["top"]]:
+            self.stdout.write(f"  {cumulativo / 1000:8.1f} ms  (próprio {proprio / 1000:6.1f} ms)  {nome}")
+
+        def mediana(chave):
+            return statistics.median(rodada[chave] for rodada in rodadas) * 1000
+
+        primeira_resposta = mediana("primeira_resposta")
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Mediana de {len(rodadas)} processos"))
+        self.stdout.write(f"  import do wsgi:       {mediana('importacao'):8.1f} ms")
+        self.stdout.write(
+            f"  primeira resposta:    {primeira_resposta:8.1f} ms  "
+            f"({rodadas[0]['status']}, {rodadas[0]['bytes']} bytes em {options['caminho']})"
+        )
+        self.stdout.write(f"  processo inteiro:     {mediana('processo'):8.1f} ms")
+
+        if options["limite_ms"] is not None and primeira_resposta > options["limite_ms"]:
+            raise CommandError(
+                f"Primeira resposta levou {primeira_resposta:.1f} ms, "
+                f"acima do limite de {options['limite_ms']:.1f} ms."
+            )
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from core.models import EstatisticasUsuario, PostAreaVerde, PostRuido, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula do zero as estatísticas de perfil a partir das tabelas de posts. "
+        "Leituras já arquivadas (arquivar_leituras) não estão mais nessas tabelas e não entram na conta; "
+        "o melhor streak nunca diminui, já que o histórico de streaks não é guardado."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=1000, help="Usuários gravados por vez.")
+
+    def handle(self, *args, **options):
+        leituras = {
+            linha["user"]: linha
+            for linha in PostRuido.objects.values("user").annotate(
+                # leituras agrupadas contam todas as amostras, com a média pesada por elas
+                total=Sum("amostras"),
+                soma=Sum(F("decibeis") * F("amostras")),
+            )
+        }
+        areas = dict(PostAreaVerde.objects.values("user").annotate(total=Count("pk")).values_list("user", "total"))
+        melhores = dict(EstatisticasUsuario.objects.values_list("user_id", "melhor_streak"))
+
+        lote = []
+        total = 0
+        with transaction.atomic():
+            for user_id, streak in User.objects.values_list("id", "streak").iterator(chunk_size=options["lote"]):
+                leitura = leituras.get(user_id, {})
+                lote.append(EstatisticasUsuario(
+                    user_id=user_id,
+                    total_leituras=leitura.get("total", 0),
+                    soma_decibeis=leitura.get("soma") or 0,
+                    total_areas_verdes=areas.get(user_id, 0),
+                    melhor_streak=max(streak, melhores.get(user_id, 0)),
+                ))
+                if len(lote) >= options["lote"]:
+                    total += self._gravar(lote)
+                    lote = []
+            total += self._gravar(lote)
+
+        self.stdout.write(self.style.SUCCESS(f"Estatísticas recalculadas para {total} usuários!"))
+
+    def _gravar(self, lote):
+        EstatisticasUsuario.objects.bulk_create(
+            lote,
+            update_conflicts=True,
+            unique_fields=["user"],
+            update_fields=["total_leituras", "soma_decibeis", "total_areas_verdes", "melhor_streak"],
+        )
+        return len(lote)
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_alter_user_email_alter_user_username'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeituraRuidoAgregada',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('celula_lat', models.IntegerField()),
+                ('celula_lon', models.IntegerField()),
+                ('amostras', models.IntegerField(default=0)),
+                ('soma_decibeis', models.FloatField(default=0)),
+                ('max_decibeis', models.FloatField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['local_data'], name='core_post_local_d_98bda0_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='leituraruidoagregada',
+            unique_together={('dia', 'celula_lat', 'celula_lon')},
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_leituraruidoagregada'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='postareaverde',
+            index=models.Index(fields=['local_latitude', 'local_longitude'], name='core_postar_local_l_446596_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_postareaverde_indice_localizacao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstatisticasUsuario',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='estatisticas', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total_leituras', models.IntegerField(default=0)),
+                ('soma_decibeis', models.FloatField(default=0)),
+                ('total_areas_verdes', models.IntegerField(default=0)),
+                ('melhor_streak', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:02
+
+import math
+
+from django.db import migrations, models
+from django.db.models import F
+
+# mesma grade de core.services.geo, copiada pra migração não depender do código atual
+TAMANHO_CELULA_GRAUS = 0.001
+
+
+def preencher_leituras_existentes(apps, schema_editor):
+    # atualizado_em/primeira_amostra_em ficam nulos: leitura antiga nunca entra no agrupamento
+    PostRuido = apps.get_model('core', 'PostRuido')
+    PostRuido.objects.update(decibeis_max=F('decibeis'))
+
+    pendentes = PostRuido.objects.filter(celula='').values_list('pk', 'local_latitude', 'local_longitude')
+    # em lotes: cada linha atualizada sai do filtro, então sempre pega os próximos 2000
+    while lote := list(pendentes[:2000]):
+        for pk, latitude, longitude in lote:
+            celula = '%d:%d' % (
+                math.floor(latitude / TAMANHO_CELULA_GRAUS),
+                math.floor(longitude / TAMANHO_CELULA_GRAUS),
+            )
+            PostRuido.objects.filter(pk=pk).update(celula=celula)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_estatisticasusuario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postruido',
+            name='amostras',
+            field=models.IntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='postruido',
+            name='atualizado_em',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='postruido',
+            name='celula',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='postruido',
+            name='decibeis_max',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name='postruido',
+            name='primeira_amostra_em',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(preencher_leituras_existentes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='postruido',
+            index=models.Index(fields=['celula', 'primeira_amostra_em'], name='core_postru_celula_37158f_idx'),
+        ),
+    ]
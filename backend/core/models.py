@@ -6,6 +6,8 @@ from django.contrib.auth.models import AbstractUser
 from django.core.validators import RegexValidator
 from django.contrib.auth.validators import UnicodeUsernameValidator
 from django.utils import timezone
+
+from .services.geo import chave_celula
 # Create your models here.
 
 MAX_RECOMPENSA = 50
@@ -44,27 +46,35 @@ class User(AbstractUser):
         return self.username
 
     def aplicar_recompensa(self):
+        # F() em vez de self.save(): o request.user pode ter vindo do cache do JWT
+        # (ou de outra instância) e gravar a linha inteira desfaria compras e resets
+        # de streak feitos nesse meio tempo.
+        from .authentication import invalidar_usuario_cache
+
         hoje = timezone.localdate()
         postou_hoje = Post.objects.filter(user = self, local_data = hoje).exists()
+        usuarios = User.objects.filter(pk=self.pk)
 
         if postou_hoje:
-            self.moedas += 1
-            self.save()
-            return {
+            usuarios.update(moedas=models.F("moedas") + 1)
+            resultado = {
                 "aumentou_streak": False,
                 "moedas_ganhas": 1
             }
-        # primeiro post do dia
-        recompensa = min(MAX_RECOMPENSA, self.streak + 1)
-        self.moedas += recompensa
-        self.streak += 1
-        self.save()
-
-        return {
+        else:
+            # primeiro post do dia
+            self.refresh_from_db(using="default", fields=["streak"])
+            recompensa = min(MAX_RECOMPENSA, self.streak + 1)
+            usuarios.update(moedas=models.F("moedas") + recompensa, streak=models.F("streak") + 1)
+            resultado = {
                 "aumentou_streak": True,
                 "moedas_ganhas": recompensa
             }
 
+        self.refresh_from_db(using="default", fields=["moedas", "streak"])
+        invalidar_usuario_cache(self.pk)
+        return resultado
+
 class IconeComprado(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     icone = models.ForeignKey(Icone, on_delete=models.CASCADE)
@@ -78,8 +88,70 @@ class Post(models.Model):
     local_longitude = models.FloatField()
     local_data = models.DateField(auto_now_add=True)
 
+    class Meta:
+        # usado pelo arquivamento, que varre as leituras mais antigas
+        indexes = [models.Index(fields=["local_data"])]
+
 class PostRuido(Post):
+    # Leituras repetidas do mesmo usuário no mesmo lugar em poucos segundos são
+    # agrupadas numa linha só (ver services/coalescencia.py): ``decibeis`` vira a
+    # média das amostras e ``decibeis_max`` o pico.
     decibeis = models.FloatField()
+    decibeis_max = models.FloatField(null=True)
+    amostras = models.IntegerField(default=1)
+    celula = models.CharField(max_length=32, blank=True, default="")
+    atualizado_em = models.DateTimeField(null=True)
+    primeira_amostra_em = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["celula", "primeira_amostra_em"])]
+
+    def save(self, *args, **kwargs):
+        # recalculados em todo save, não só no create: um PUT pode mudar o lugar ou a medição
+        self.celula = chave_celula(self.local_latitude, self.local_longitude)
+        if self.decibeis_max is None or self.amostras <= 1:
+            self.decibeis_max = self.decibeis
+        else:
+            # numa leitura agrupada o pico nunca pode ficar abaixo da média
+            self.decibeis_max = max(self.decibeis_max, self.decibeis)
+        if self.atualizado_em is None:
+            self.atualizado_em = timezone.now()
+        if self.primeira_amostra_em is None:
+            self.primeira_amostra_em = self.atualizado_em
+        super().save(*args, **kwargs)
+
+
+class LeituraRuidoAgregada(models.Model):
+    """Resumo diário por célula da grade das leituras de ruído já arquivadas."""
+
+    dia = models.DateField()
+    celula_lat = models.IntegerField()
+    celula_lon = models.IntegerField()
+    amostras = models.IntegerField(default=0)
+    soma_decibeis = models.FloatField(default=0)
+    max_decibeis = models.FloatField(default=0)
+
+    class Meta:
+        unique_together = ('dia', 'celula_lat', 'celula_lon')
+
+    @property
+    def media_decibeis(self) -> float:
+        return self.soma_decibeis / self.amostras if self.amostras else 0.0
+
+
+class EstatisticasUsuario(models.Model):
+    """Totais do perfil mantidos a cada post, pra não precisar de COUNT/AVG na hora de mostrar."""
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True,
+                                related_name="estatisticas")
+    total_leituras = models.IntegerField(default=0)
+    soma_decibeis = models.FloatField(default=0)
+    total_areas_verdes = models.IntegerField(default=0)
+    melhor_streak = models.IntegerField(default=0)
+
+    @property
+    def media_decibeis(self) -> Optional[float]:
+        return self.soma_decibeis / self.total_leituras if self.total_leituras else None
 
 
 class PostAreaVerde(models.Model):
@@ -94,15 +166,21 @@ class PostAreaVerde(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        # pré-filtro por bbox da busca de áreas próximas
+        indexes = [models.Index(fields=["local_latitude", "local_longitude"])]
 
     def __str__(self) -> str:
         return f"Área Verde: {self.titulo} ({self.id})"
 
     @property
     def imagem_url(self) -> Optional[str]:
+        return self.montar_imagem_url(self.imagem_nome)
+
+    @staticmethod
+    def montar_imagem_url(imagem_nome: str) -> Optional[str]:
         bucket = getattr(settings, "SUPABASE_AREAS_BUCKET", "")
         base_public = getattr(settings, "SUPABASE_PUBLIC_URL", "")
-        if not bucket or not base_public or not self.imagem_nome:
+        if not bucket or not base_public or not imagem_nome:
             return None
         base_public = base_public.rstrip("/")
-        return f"{base_public}/{bucket}/{self.imagem_nome}"
+        return f"{base_public}/{bucket}/{imagem_nome}"
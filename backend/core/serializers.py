@@ -1,7 +1,7 @@
 from django.core.exceptions import ImproperlyConfigured
 from rest_framework import serializers
 
-from .models import User, Icone, IconeComprado, Post, PostRuido, PostAreaVerde
+from .models import User, Icone, IconeComprado, Post, PostRuido, PostAreaVerde, EstatisticasUsuario
 from .services.image_storage import upload_area_verde_image
 
 
@@ -27,6 +27,14 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
 
+class EstatisticasUsuarioSerializer(serializers.ModelSerializer):
+    media_decibeis = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = EstatisticasUsuario
+        fields = ['user', 'total_leituras', 'media_decibeis', 'total_areas_verdes', 'melhor_streak']
+
+
 class IconeCompradoSerializer(serializers.ModelSerializer):
     class Meta:
         model = IconeComprado
@@ -47,7 +55,9 @@ class PostSerializer(serializers.ModelSerializer):
 class PostRuidoSerializer(serializers.ModelSerializer):
     class Meta:
         model = PostRuido
-        fields = ['id', 'user', 'local_latitude', 'local_longitude', 'local_data', 'decibeis']
+        fields = ['id', 'user', 'local_latitude', 'local_longitude', 'local_data', 'decibeis',
+                  'decibeis_max', 'amostras']
+        read_only_fields = ['decibeis_max', 'amostras']
 
 
 class PostAreaVerdeSerializer(serializers.ModelSerializer):
@@ -0,0 +1,38 @@
+import time
+from typing import Dict, List, Optional
+
+from django.conf import settings
+
+from ..models import Icone
+
+# Os ícones só mudam pelo popular_icones, então o catálogo fica em memória no processo.
+# O TTL cobre escritas feitas em outro processo, onde o sinal de invalidação não chega.
+_catalogo: Optional[List[Icone]] = None
+_por_id: Dict[int, Icone] = {}
+_carregado_em = 0.0
+
+
+def listar_icones() -> List[Icone]:
+    global _catalogo, _por_id, _carregado_em
+
+    if _catalogo is not None and time.monotonic() - _carregado_em < settings.ICONES_CACHE_TTL:
+        return _catalogo
+
+    catalogo = list(Icone.objects.order_by("id"))
+    _por_id = {icone.id: icone for icone in catalogo}
+    _carregado_em = time.monotonic()
+    _catalogo = catalogo
+    return catalogo
+
+
+def obter_icone(pk) -> Optional[Icone]:
+    listar_icones()
+    try:
+        return _por_id.get(int(pk))
+    except (TypeError, ValueError):
+        return None
+
+
+def invalidar_catalogo() -> None:
+    global _catalogo
+    _catalogo = None
@@ -0,0 +1,145 @@
+from typing import Dict, List, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Count, F, Min, Value
+from django.db.models.functions import Floor
+
+from ..streaming import CAMPOS_AREA_VERDE, area_verde_para_dict
+from .geo import indice_celula
+
+# O mapa é dividido em tiles quadrados de 360/2^zoom graus (a mesma progressão do
+# zoom do mapa) e cada tile em CELULAS_POR_TILE x CELULAS_POR_TILE células.
+# Cada célula com área verde vira um cluster. O resultado é guardado no cache por
+# (zoom, tile), então mover o mapa só recalcula os tiles que ainda não foram vistos.
+CELULAS_POR_TILE = 4
+MAX_TILES = 100
+
+_CHAVE_GERACAO = "clusters_areas:geracao"
+
+Tile = Tuple[int, int]
+
+
+def tamanho_tile(zoom: int) -> float:
+    return 360.0 / 2 ** zoom
+
+
+def tiles_no_bbox(zoom: int, bbox: Tuple[float, float, float, float]) -> List[Tile]:
+    """Tiles ``(lat, lon)`` do zoom que cobrem o bbox (``min_lon, min_lat, max_lon, max_lat``)."""
+
+    min_lon, min_lat, max_lon, max_lat = bbox
+    tamanho = tamanho_tile(zoom)
+    lats = range(indice_celula(min_lat, tamanho), indice_celula(max_lat, tamanho) + 1)
+    lons = range(indice_celula(min_lon, tamanho), indice_celula(max_lon, tamanho) + 1)
+    if len(lats) * len(lons) > MAX_TILES:
+        raise ValueError("bbox grande demais pra esse zoom; aumente o zoom ou diminua a área.")
+    return [(lat, lon) for lat in lats for lon in lons]
+
+
+def _geracao() -> int:
+    return cache.get_or_set(_CHAVE_GERACAO, 1, timeout=None)
+
+
+def invalidar_clusters() -> None:
+    """Descarta todos os tiles em cache trocando a geração que entra nas chaves.
+
+    Com o cache em memória (sem CACHE_URL) isso só vale pro processo que salvou a
+    área; os outros esperam o ``CLUSTER_CACHE_TTL``, que por isso é curto nesse caso.
+    """
+
+    try:
+        cache.incr(_CHAVE_GERACAO)
+    except ValueError:  # a chave expirou/nunca existiu
+        cache.add(_CHAVE_GERACAO, 2, timeout=None)
+
+
+def _chave(geracao: int, zoom: int, tile: Tile) -> str:
+    return f"clusters_areas:{geracao}:{zoom}:{tile[0]}:{tile[1]}"
+
+
+def _no_retangulo(queryset, zoom: int, tiles: List[Tile]):
+    """Filtra as áreas dentro do retângulo que envolve os tiles (pelo índice lat/lon)."""
+
+    tamanho = tamanho_tile(zoom)
+    min_lat, max_lat = min(t[0] for t in tiles), max(t[0] for t in tiles)
+    min_lon, max_lon = min(t[1] for t in tiles), max(t[1] for t in tiles)
+    return queryset.filter(
+        local_latitude__gte=min_lat * tamanho,
+        local_latitude__lt=(max_lat + 1) * tamanho,
+        local_longitude__gte=min_lon * tamanho,
+        local_longitude__lt=(max_lon + 1) * tamanho,
+    )
+
+
+def _calcular_clusters(queryset, zoom: int, tiles: List[Tile]) -> Dict[Tile, list]:
+    tamanho_celula = tamanho_tile(zoom) / CELULAS_POR_TILE
+    grupos = list(
+        _no_retangulo(queryset, zoom, tiles)
+        .order_by()
+        .annotate(
+            celula_lat=Floor(F("local_latitude") / Value(tamanho_celula)),
+            celula_lon=Floor(F("local_longitude") / Value(tamanho_celula)),
+        )
+        .values("celula_lat", "celula_lon")
+        .annotate(
+            total=Count("id"),
+            latitude=Avg("local_latitude"),
+            longitude=Avg("local_longitude"),
+            representante=Min("id"),
+        )
+    )
+
+    # o representante de cada célula é a área mais antiga dela (menor id)
+    representantes = {
+        linha[0]: area_verde_para_dict(linha)
+        for linha in queryset.filter(pk__in=[g["representante"] for g in grupos])
+        .order_by()
+        .values_list(*CAMPOS_AREA_VERDE)
+    }
+
+    por_tile = {tile: [] for tile in tiles}
+    for grupo in grupos:
+        tile = (int(grupo["celula_lat"]) // CELULAS_POR_TILE, int(grupo["celula_lon"]) // CELULAS_POR_TILE)
+        if tile not in por_tile:  # parte do retângulo fora dos tiles pedidos
+            continue
+        por_tile[tile].append({
+            "latitude": grupo["latitude"],
+            "longitude": grupo["longitude"],
+            "count": grupo["total"],
+            "representante": representantes.get(grupo["representante"]),
+        })
+    return por_tile
+
+
+def _calcular_marcadores(queryset, zoom: int, tiles: List[Tile]) -> Dict[Tile, list]:
+    tamanho = tamanho_tile(zoom)
+    por_tile = {tile: [] for tile in tiles}
+    for linha in _no_retangulo(queryset, zoom, tiles).order_by("id").values_list(*CAMPOS_AREA_VERDE):
+        tile = (indice_celula(linha[2], tamanho), indice_celula(linha[3], tamanho))
+        if tile in por_tile:
+            por_tile[tile].append(area_verde_para_dict(linha))
+    return por_tile
+
+
+def clusters_areas_verdes(queryset, zoom: int, tiles: List[Tile]) -> dict:
+    """Clusters (ou marcadores, a partir de ``CLUSTER_ZOOM_MARCADORES``) dos tiles pedidos."""
+
+    marcadores = zoom >= settings.CLUSTER_ZOOM_MARCADORES
+
+    geracao = _geracao()
+    chaves = {tile: _chave(geracao, zoom, tile) for tile in tiles}
+    em_cache = cache.get_many(chaves.values())
+    faltando = [tile for tile in tiles if chaves[tile] not in em_cache]
+
+    if faltando:
+        calcular = _calcular_marcadores if marcadores else _calcular_clusters
+        novos = calcular(queryset, zoom, faltando)
+        cache.set_many({chaves[tile]: itens for tile, itens in novos.items()}, settings.CLUSTER_CACHE_TTL)
+        em_cache.update({chaves[tile]: itens for tile, itens in novos.items()})
+
+    itens = [item for tile in tiles for item in em_cache[chaves[tile]]]
+    return {
+        "zoom": zoom,
+        "clusters": [] if marcadores else itens,
+        "marcadores": itens if marcadores else [],
+    }
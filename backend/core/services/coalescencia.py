@@ -0,0 +1,62 @@
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from ..models import PostRuido
+from .geo import chaves_vizinhas, haversine_km
+
+# quantas leituras recentes da vizinhança conferir antes de desistir de agrupar
+MAX_CANDIDATOS = 5
+
+
+def coalescer_leitura(user, latitude: float, longitude: float, decibeis: float) -> Optional[PostRuido]:
+    """Junta a leitura numa ``PostRuido`` recente do mesmo usuário, se houver uma perto.
+
+    Procura pelo índice (célula, primeira_amostra_em) nas células vizinhas, confere
+    a distância exata e atualiza a média, o pico e o número de amostras num único
+    UPDATE. Devolve a leitura atualizada, ou ``None`` se a leitura deve virar uma
+    linha nova.
+
+    A janela conta a partir da primeira amostra da linha (não da última), então
+    uma sequência parada no mesmo lugar vira uma linha por janela em vez de uma
+    linha crescendo pra sempre. E só agrupa com leituras do mesmo dia: a primeira
+    do dia precisa virar um Post novo pra contar na recompensa e no streak.
+    """
+
+    janela = settings.COALESCER_JANELA_SEGUNDOS
+    raio_km = settings.COALESCER_RAIO_METROS / 1000
+    if janela <= 0 or raio_km <= 0:
+        return None
+
+    agora = timezone.now()
+    limite = agora - timedelta(seconds=janela)
+    candidatos = (
+        PostRuido.objects.filter(
+            celula__in=chaves_vizinhas(latitude, longitude),
+            primeira_amostra_em__gte=limite,
+            local_data=timezone.localdate(),
+            user=user,
+        )
+        .order_by("-primeira_amostra_em")
+        .values_list("pk", "local_latitude", "local_longitude")[:MAX_CANDIDATOS]
+    )
+
+    for pk, lat, lon in candidatos:
+        if haversine_km(latitude, longitude, lat, lon) > raio_km:
+            continue
+        # no SET todos os F() leem o valor antigo da linha, então a média usa o
+        # número de amostras de antes do incremento
+        agrupada = PostRuido.objects.filter(pk=pk, primeira_amostra_em__gte=limite).update(
+            decibeis=(F("decibeis") * F("amostras") + decibeis) / (F("amostras") + 1),
+            decibeis_max=Greatest(F("decibeis_max"), decibeis),
+            amostras=F("amostras") + 1,
+            atualizado_em=agora,
+        )
+        if agrupada:
+            return PostRuido.objects.get(pk=pk)
+
+    return None
@@ -0,0 +1,66 @@
+from typing import Optional, Tuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from ..models import EstatisticasUsuario, PostAreaVerde, PostRuido
+
+# (leituras, soma dos decibéis, áreas verdes) que um post soma nas estatísticas do dono
+Contribuicao = Tuple[int, float, int]
+
+
+def registrar_post(user, decibeis: Optional[float] = None, area_verde: bool = False) -> None:
+    """Atualiza as estatísticas do usuário com ``F()``, sem ler a linha antes.
+
+    Chamar depois de ``aplicar_recompensa``, pra ``user.streak`` já estar atualizado.
+    """
+
+    valores = {"melhor_streak": Greatest(F("melhor_streak"), user.streak)}
+    if decibeis is not None:
+        valores["total_leituras"] = F("total_leituras") + 1
+        valores["soma_decibeis"] = F("soma_decibeis") + decibeis
+    if area_verde:
+        valores["total_areas_verdes"] = F("total_areas_verdes") + 1
+
+    _atualizar(user.pk, valores)
+
+
+def contribuicao(post) -> Contribuicao:
+    """Quanto ``post`` (``Post``, ``PostRuido`` ou ``PostAreaVerde``) pesa nas estatísticas."""
+
+    if isinstance(post, PostAreaVerde):
+        return 0, 0.0, 1
+    if not isinstance(post, PostRuido):
+        # Post genérico: pode ser o pai de uma leitura de ruído (posts/ também apaga essas)
+        post = PostRuido.objects.filter(pk=post.pk).only("decibeis", "amostras").first()
+        if post is None:
+            return 0, 0.0, 0
+    # leitura agrupada conta todas as amostras, como no recalcular_estatisticas
+    return post.amostras, post.decibeis * post.amostras, 0
+
+
+def ajustar_estatisticas(user_id, antes: Contribuicao = (0, 0.0, 0), depois: Contribuicao = (0, 0.0, 0)) -> None:
+    """Troca a contribuição ``antes`` de um post pela ``depois`` (edição, ou apagar com ``depois`` zerado)."""
+
+    leituras, soma, areas = (novo - velho for velho, novo in zip(antes, depois))
+    if not (leituras or soma or areas):
+        return
+    _atualizar(user_id, {
+        "total_leituras": F("total_leituras") + leituras,
+        "soma_decibeis": F("soma_decibeis") + soma,
+        "total_areas_verdes": F("total_areas_verdes") + areas,
+    })
+
+
+def _atualizar(user_id, valores) -> None:
+    if EstatisticasUsuario.objects.filter(user_id=user_id).update(**valores):
+        return
+
+    # primeiro post do usuário: cria a linha e aplica o incremento nela
+    try:
+        with transaction.atomic():
+            EstatisticasUsuario.objects.create(user_id=user_id)
+    except IntegrityError:
+        pass  # outra request criou ao mesmo tempo
+    EstatisticasUsuario.objects.filter(user_id=user_id).update(**valores)
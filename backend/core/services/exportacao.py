@@ -0,0 +1,215 @@
+import csv
+import gzip
+import io
+import json
+from datetime import date, datetime
+from itertools import islice
+from typing import IO, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+
+from ..models import PostRuido
+
+# (nome da coluna, tipo) — o tipo só importa pro Parquet, que precisa de schema fixo
+Coluna = Tuple[str, str]
+
+FORMATOS_ARQUIVO = ("parquet", "csv")
+FORMATOS_EXPORTACAO = ("csv", "ndjson", "parquet")
+
+EXTENSOES = {
+    "parquet": ".parquet",
+    "csv": ".csv",
+    "ndjson": ".ndjson",
+}
+
+CONTENT_TYPES = {
+    "parquet": "application/vnd.apache.parquet",
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+COLUNAS_LEITURA_RUIDO: List[Coluna] = [
+    ("id", "int"),
+    ("user_id", "int"),
+    ("local_latitude", "float"),
+    ("local_longitude", "float"),
+    ("local_data", "date"),
+    ("decibeis", "float"),
+    ("decibeis_max", "float"),
+    ("amostras", "int"),
+]
+
+
+class _EscritorTexto:
+    """Base dos formatos de texto: escreve bytes no destino, opcionalmente via gzip."""
+
+    def __init__(self, destino: IO[bytes], colunas: Sequence[Coluna], comprimir: bool = False):
+        self._gzip = gzip.GzipFile(fileobj=destino, mode="wb") if comprimir else None
+        self._saida = self._gzip or destino
+        self._nomes = [nome for nome, _ in colunas]
+
+    def fechar(self) -> None:
+        # fecha só o gzip; o arquivo de destino é de quem chamou
+        if self._gzip is not None:
+            self._gzip.close()
+
+
+class EscritorCsv(_EscritorTexto):
+    def __init__(self, destino: IO[bytes], colunas: Sequence[Coluna], comprimir: bool = False):
+        super().__init__(destino, colunas, comprimir)
+        self.escrever([self._nomes])
+
+    def escrever(self, linhas: Iterable[Sequence]) -> None:
+        texto = io.StringIO(newline="")
+        csv.writer(texto).writerows(linhas)
+        self._saida.write(texto.getvalue().encode("utf-8"))
+
+
+def _json_padrao(valor):
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    raise TypeError(f"Tipo não serializável: {type(valor).__name__}")
+
+
+class EscritorNdjson(_EscritorTexto):
+    def escrever(self, linhas: Iterable[Sequence]) -> None:
+        texto = "".join(
+            json.dumps(dict(zip(self._nomes, linha)), ensure_ascii=False, default=_json_padrao) + "\n"
+            for linha in linhas
+        )
+        self._saida.write(texto.encode("utf-8"))
+
+
+class EscritorParquet:
+    """Escreve cada lote como um row group de um arquivo Parquet (requer pyarrow)."""
+
+    def __init__(self, destino: IO[bytes], colunas: Sequence[Coluna]):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as exc:
+            raise RuntimeError("Formato parquet requer o pacote pyarrow instalado.") from exc
+
+        tipos = {
+            "int": pa.int64(),
+            "float": pa.float64(),
+            "date": pa.date32(),
+            "datetime": pa.timestamp("us", tz="UTC"),
+            "str": pa.string(),
+        }
+        self._pa = pa
+        self._schema = pa.schema([(nome, tipos[tipo]) for nome, tipo in colunas])
+        self._writer = pq.ParquetWriter(destino, self._schema, compression="zstd")
+
+    def escrever(self, linhas: Iterable[Sequence]) -> None:
+        linhas = list(linhas)
+        if not linhas:
+            return
+        colunas = list(zip(*linhas))
+        tabela = self._pa.Table.from_arrays(
+            [self._pa.array(valores, type=self._schema.field(i).type) for i, valores in enumerate(colunas)],
+            schema=self._schema,
+        )
+        self._writer.write_table(tabela)
+
+    def fechar(self) -> None:
+        self._writer.close()
+
+
+def abrir_escritor(formato: str, destino: IO[bytes], colunas: Sequence[Coluna], comprimir: bool = False):
+    if formato == "parquet":
+        # Parquet já é comprimido por coluna
+        return EscritorParquet(destino, colunas)
+    if formato == "csv":
+        return EscritorCsv(destino, colunas, comprimir)
+    if formato == "ndjson":
+        return EscritorNdjson(destino, colunas, comprimir)
+    raise ValueError(f"Formato desconhecido: {formato}")
+
+
+def extensao(formato: str, comprimir: bool = False) -> str:
+    if comprimir and formato != "parquet":
+        return EXTENSOES[formato] + ".gz"
+    return EXTENSOES[formato]
+
+
+def em_lotes(linhas: Iterable[Sequence], tamanho: int) -> Iterator[List[Sequence]]:
+    linhas = iter(linhas)
+    while lote := list(islice(linhas, tamanho)):
+        yield lote
+
+
+class _BufferStreaming:
+    """Arquivo só de escrita que acumula os bytes até alguém drenar (pra respostas HTTP)."""
+
+    closed = False
+
+    def __init__(self):
+        self._partes: List[bytes] = []
+        self._posicao = 0
+
+    def write(self, dados) -> int:
+        dados = bytes(dados)
+        self._partes.append(dados)
+        self._posicao += len(dados)
+        return len(dados)
+
+    def tell(self) -> int:
+        return self._posicao
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drenar(self) -> bytes:
+        dados = b"".join(self._partes)
+        self._partes = []
+        return dados
+
+
+def gerar_bytes(formato: str, colunas: Sequence[Coluna], lotes: Iterable[Sequence[Sequence]]) -> Iterator[bytes]:
+    """Serializa os lotes no formato pedido, devolvendo os bytes de cada lote assim que ficam prontos."""
+
+    buffer = _BufferStreaming()
+    escritor = abrir_escritor(formato, buffer, colunas)
+    for lote in lotes:
+        escritor.escrever(lote)
+        dados = buffer.drenar()
+        if dados:
+            yield dados
+    escritor.fechar()
+    yield buffer.drenar()
+
+
+def leituras_ruido(
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+    desde: Optional[date] = None,
+    ate: Optional[date] = None,
+    queryset=None,
+):
+    """Leituras de ruído filtradas, já como tuplas na ordem de ``COLUNAS_LEITURA_RUIDO``."""
+
+    queryset = PostRuido.objects.all() if queryset is None else queryset
+    if bbox is not None:
+        min_lon, min_lat, max_lon, max_lat = bbox
+        queryset = queryset.filter(
+            local_latitude__gte=min_lat,
+            local_latitude__lte=max_lat,
+            local_longitude__gte=min_lon,
+            local_longitude__lte=max_lon,
+        )
+    if desde is not None:
+        queryset = queryset.filter(local_data__gte=desde)
+    if ate is not None:
+        queryset = queryset.filter(local_data__lte=ate)
+
+    return queryset.order_by("id").values_list(*[nome for nome, _ in COLUNAS_LEITURA_RUIDO])
+
+
+def iterar_em_lotes(queryset, tamanho: Optional[int] = None) -> Iterator[List[Sequence]]:
+    """Lê o queryset por um cursor do servidor (``iterator``) e agrupa em lotes."""
+
+    tamanho = tamanho or settings.STREAMING_CHUNK_SIZE
+    return em_lotes(queryset.iterator(chunk_size=tamanho), tamanho)
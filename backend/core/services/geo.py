@@ -0,0 +1,113 @@
+import math
+from typing import List, Sequence, Tuple
+
+RAIO_TERRA_KM = 6371.0088
+
+# ~110 m de lado no equador, suficiente pra agregar leituras de um mesmo quarteirão
+TAMANHO_CELULA_GRAUS = 0.001
+
+
+def indice_celula(valor: float, tamanho: float = TAMANHO_CELULA_GRAUS) -> int:
+    """Índice inteiro da faixa da grade que contém ``valor`` (em graus)."""
+
+    return math.floor(valor / tamanho)
+
+
+def centro_celula(indice: int, tamanho: float = TAMANHO_CELULA_GRAUS) -> float:
+    return (indice + 0.5) * tamanho
+
+
+def celula(latitude: float, longitude: float, tamanho: float = TAMANHO_CELULA_GRAUS) -> Tuple[int, int]:
+    return indice_celula(latitude, tamanho), indice_celula(longitude, tamanho)
+
+
+def chave_celula(latitude: float, longitude: float, tamanho: float = TAMANHO_CELULA_GRAUS) -> str:
+    """Identificador em texto da célula, pra guardar e indexar no banco."""
+
+    return "%d:%d" % celula(latitude, longitude, tamanho)
+
+
+def chaves_vizinhas(latitude: float, longitude: float, tamanho: float = TAMANHO_CELULA_GRAUS) -> List[str]:
+    """A célula do ponto e as oito em volta (cobre qualquer raio menor que uma célula)."""
+
+    lat, lon = celula(latitude, longitude, tamanho)
+    return ["%d:%d" % (lat + d_lat, lon + d_lon) for d_lat in (-1, 0, 1) for d_lon in (-1, 0, 1)]
+
+
+def ler_bbox(texto: str) -> Tuple[float, float, float, float]:
+    """Lê ``min_lon,min_lat,max_lon,max_lat`` (ordem do GeoJSON)."""
+
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(valor) for valor in texto.split(","))
+    except ValueError as exc:
+        raise ValueError("bbox deve ser min_lon,min_lat,max_lon,max_lat.") from exc
+
+    if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lon <= max_lon <= 180):
+        raise ValueError("bbox fora dos limites ou com mínimos maiores que máximos.")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def caixa_ao_redor(latitude: float, longitude: float, raio_km: float) -> Tuple[float, float, float, float]:
+    """Bbox (``min_lon, min_lat, max_lon, max_lat``) que contém o círculo de ``raio_km``.
+
+    Serve de pré-filtro indexado; a distância de verdade é conferida depois.
+    Não trata a travessia do antimeridiano (os limites só são cortados em ±180).
+    """
+
+    delta_lat = math.degrees(raio_km / RAIO_TERRA_KM)
+    cos_lat = math.cos(math.radians(latitude))
+    delta_lon = 180.0 if cos_lat < 1e-9 else min(180.0, delta_lat / cos_lat)
+    return (
+        max(-180.0, longitude - delta_lon),
+        max(-90.0, latitude - delta_lat),
+        min(180.0, longitude + delta_lon),
+        min(90.0, latitude + delta_lat),
+    )
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    fi1, fi2 = math.radians(lat1), math.radians(lat2)
+    d_fi = fi2 - fi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_fi / 2) ** 2 + math.cos(fi1) * math.cos(fi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * RAIO_TERRA_KM * math.asin(math.sqrt(min(1.0, a)))
+
+
+def mais_proximos(
+    latitude: float,
+    longitude: float,
+    candidatos: Sequence[Tuple[int, float, float]],
+    raio_km: float,
+    k: int,
+) -> List[Tuple[int, float]]:
+    """Os ``k`` candidatos ``(id, lat, lon)`` mais perto, dentro do raio, como ``(id, distância_km)``.
+
+    Usa NumPy pra calcular todas as distâncias de uma vez quando está instalado;
+    sem ele cai no cálculo em Python puro, que dá o mesmo resultado.
+    """
+
+    if not candidatos:
+        return []
+
+    try:
+        import numpy as np
+    except ImportError:
+        distancias = [
+            (id_, haversine_km(latitude, longitude, lat, lon)) for id_, lat, lon in candidatos
+        ]
+        dentro = sorted((item for item in distancias if item[1] <= raio_km), key=lambda item: item[1])
+        return dentro[:k]
+
+    ids, lats, lons = (np.asarray(coluna) for coluna in zip(*candidatos))
+    fi1 = math.radians(latitude)
+    fi2 = np.radians(lats.astype(float))
+    d_fi = fi2 - fi1
+    d_lambda = np.radians(lons.astype(float) - longitude)
+    a = np.sin(d_fi / 2) ** 2 + math.cos(fi1) * np.cos(fi2) * np.sin(d_lambda / 2) ** 2
+    distancias = 2 * RAIO_TERRA_KM * np.arcsin(np.sqrt(np.minimum(1.0, a)))
+
+    dentro = np.flatnonzero(distancias <= raio_km)
+    if len(dentro) > k:
+        dentro = dentro[np.argpartition(distancias[dentro], k - 1)[:k]]
+    dentro = dentro[np.argsort(distancias[dentro], kind="stable")]
+    return [(int(ids[i]), float(distancias[i])) for i in dentro]
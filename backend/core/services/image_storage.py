@@ -1,15 +1,17 @@
 import base64
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
-from supabase import Client, create_client
+
+if TYPE_CHECKING:
+    from supabase import Client
 
 DEFAULT_CONTENT_TYPE = "image/jpeg"
 
-_supabase_client: Optional[Client] = None
+_supabase_client: Optional["Client"] = None
 
-def _get_supabase_client() -> Client:
+def _get_supabase_client() -> "Client":
     global _supabase_client
     if _supabase_client is not None:
         return _supabase_client
@@ -19,6 +21,9 @@ def _get_supabase_client() -> Client:
             "Supabase credentials are not configured. Set SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY."
         )
 
+    # import adiado: o pacote supabase leva ~300 ms pra carregar e só o upload de imagem precisa dele
+    from supabase import create_client
+
     _supabase_client = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_ROLE_KEY)
     return _supabase_client
 
@@ -0,0 +1,22 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import invalidar_usuario_cache
+from .models import Icone, PostAreaVerde, User
+from .services.catalogo_icones import invalidar_catalogo
+from .services.clusters import invalidar_clusters
+
+
+@receiver([post_save, post_delete], sender=Icone)
+def invalidar_catalogo_icones(sender, **kwargs):
+    invalidar_catalogo()
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidar_cache_usuario(sender, instance, **kwargs):
+    invalidar_usuario_cache(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=PostAreaVerde)
+def invalidar_clusters_areas(sender, **kwargs):
+    invalidar_clusters()
@@ -0,0 +1,186 @@
+"""Serialização leve (a partir de tuplas do ``values_list``) pras respostas JSON em streaming.
+
+Cada ``CAMPOS_*`` lista as colunas buscadas no banco e a função ``*_para_dict``
+correspondente monta o mesmo formato que o serializer DRF do modelo devolveria.
+"""
+
+import json
+from datetime import datetime
+from typing import AsyncIterable, Callable, Iterable, Iterator, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import LeituraRuidoAgregada, PostAreaVerde, PostRuido
+from .services.exportacao import COLUNAS_LEITURA_RUIDO
+from .services.geo import centro_celula
+
+# linhas acumuladas antes de mandar um pedaço da resposta
+LINHAS_POR_PEDACO = 500
+
+
+def formatar_data_hora(valor: Optional[datetime]) -> Optional[str]:
+    """Mesmo formato do ``DateTimeField`` do DRF (ISO 8601, UTC como ``Z``)."""
+
+    if valor is None:
+        return None
+    valor = timezone.localtime(valor)
+    texto = valor.isoformat()
+    if texto.endswith("+00:00"):
+        texto = texto[:-6] + "Z"
+    return texto
+
+
+def _dumps(dado) -> str:
+    # mesmas opções do JSONRenderer do DRF
+    return json.dumps(dado, ensure_ascii=False, separators=(",", ":"))
+
+
+# mesmas colunas da exportação, na mesma ordem
+CAMPOS_POST_RUIDO = tuple(nome for nome, _ in COLUNAS_LEITURA_RUIDO)
+
+
+def post_ruido_para_dict(linha: Sequence) -> dict:
+    id_, user, latitude, longitude, local_data, decibeis, decibeis_max, amostras = linha
+    return {
+        "id": id_,
+        "user": user,
+        "local_latitude": latitude,
+        "local_longitude": longitude,
+        "local_data": local_data.isoformat() if local_data else None,
+        "decibeis": decibeis,
+        "decibeis_max": decibeis_max,
+        "amostras": amostras,
+    }
+
+
+CAMPOS_PONTO_CALOR = ("local_latitude", "local_longitude", "decibeis")
+
+
+def ponto_calor_para_dict(linha: Sequence) -> dict:
+    latitude, longitude, decibeis = linha
+    return {"latitude": latitude, "longitude": longitude, "weight": decibeis}
+
+
+# leituras já arquivadas entram no mapa pela média da célula no dia
+CAMPOS_PONTO_AGREGADO = ("celula_lat", "celula_lon", "soma_decibeis", "amostras")
+
+
+def ponto_agregado(linha: Sequence) -> Tuple[float, float, float]:
+    celula_lat, celula_lon, soma, amostras = linha
+    return centro_celula(celula_lat), centro_celula(celula_lon), soma / amostras if amostras else 0.0
+
+
+def pontos_calor(banco: str) -> Iterator[Sequence]:
+    """Leituras ainda no banco seguidas das células arquivadas, como ``(lat, lon, decibeis)``."""
+
+    leituras = PostRuido.objects.using(banco).values_list(*CAMPOS_PONTO_CALOR)
+    yield from leituras.iterator(chunk_size=settings.STREAMING_CHUNK_SIZE)
+
+    agregadas = LeituraRuidoAgregada.objects.using(banco).values_list(*CAMPOS_PONTO_AGREGADO)
+    for linha in agregadas.iterator(chunk_size=settings.STREAMING_CHUNK_SIZE):
+        yield ponto_agregado(linha)
+
+
+CAMPOS_AREA_VERDE = (
+    "id",
+    "user_id",
+    "local_latitude",
+    "local_longitude",
+    "created_at",
+    "titulo",
+    "modo_acesso",
+    "descricao",
+    "imagem_nome",
+)
+
+
+def area_verde_para_dict(linha: Sequence) -> dict:
+    id_, user, latitude, longitude, created_at, titulo, modo_acesso, descricao, imagem_nome = linha
+    return {
+        "id": id_,
+        "user": user,
+        "local_latitude": latitude,
+        "local_longitude": longitude,
+        "created_at": formatar_data_hora(created_at),
+        "titulo": titulo,
+        "modo_acesso": modo_acesso,
+        "descricao": descricao,
+        "imagem_nome": imagem_nome,
+        "imagem_url": PostAreaVerde.montar_imagem_url(imagem_nome),
+    }
+
+
+CAMPOS_USUARIO = ("id", "username", "first_name", "last_name", "email", "streak", "moedas", "id_icone_id")
+
+
+def usuario_para_dict(linha: Sequence) -> dict:
+    id_, username, first_name, last_name, email, streak, moedas, id_icone = linha
+    return {
+        "id": id_,
+        "username": username,
+        "first_name": first_name,
+        "last_name": last_name,
+        "email": email,
+        "streak": streak,
+        "moedas": moedas,
+        "id_icone": id_icone,
+    }
+
+
+def json_array(linhas: Iterable[Sequence], formatar: Callable[[Sequence], dict]):
+    """Gera um array JSON em pedaços de bytes, sem montar a lista inteira na memória."""
+
+    yield b"["
+    pedaco = []
+    separador = ""
+    for linha in linhas:
+        pedaco.append(separador + _dumps(formatar(linha)))
+        separador = ","
+        if len(pedaco) >= LINHAS_POR_PEDACO:
+            yield "".join(pedaco).encode()
+            pedaco = []
+    if pedaco:
+        yield "".join(pedaco).encode()
+    yield b"]"
+
+
+def resposta_json_streaming(queryset, campos: Sequence[str], formatar: Callable[[Sequence], dict]):
+    """Responde ``queryset`` como array JSON lido em lotes por um cursor do banco.
+
+    O corpo só é gerado depois que a view retorna, então o queryset é fixado
+    agora no banco escolhido pelo roteador (réplica, nas ações de leitura).
+    """
+
+    queryset = queryset.using(queryset.db).values_list(*campos)
+    linhas = queryset.iterator(chunk_size=settings.STREAMING_CHUNK_SIZE)
+    return StreamingHttpResponse(json_array(linhas, formatar), content_type="application/json")
+
+
+def resposta_mapa_calor(banco: str):
+    """``{"points": [...]}`` com todos os pontos do mapa de calor, em streaming."""
+
+    def corpo():
+        yield b'{"points":'
+        yield from json_array(pontos_calor(banco), ponto_calor_para_dict)
+        yield b"}"
+
+    return StreamingHttpResponse(corpo(), content_type="application/json")
+
+
+async def json_array_async(linhas: AsyncIterable[Sequence], formatar: Callable[[Sequence], dict]):
+    """Gera um array JSON em pedaços de bytes, sem montar a lista inteira na memória."""
+
+    yield b"["
+    pedaco = []
+    separador = ""
+    async for linha in linhas:
+        pedaco.append(separador + _dumps(formatar(linha)))
+        separador = ","
+        if len(pedaco) >= LINHAS_POR_PEDACO:
+            yield "".join(pedaco).encode()
+            pedaco = []
+    if pedaco:
+        yield "".join(pedaco).encode()
+    yield b"]"
@@ -1,3 +1,399 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import os
+import sys
+import tempfile
+from datetime import timedelta
+from importlib.util import find_spec
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .db_router import REPLICA, leitura_na_replica
+from .models import (
+    EstatisticasUsuario,
+    Icone,
+    IconeComprado,
+    LeituraRuidoAgregada,
+    Post,
+    PostAreaVerde,
+    PostRuido,
+    User,
+)
+from .services.coalescencia import coalescer_leitura
+from .services.estatisticas import registrar_post
+from .services.geo import celula, chave_celula, haversine_km, mais_proximos
 
 # Create your tests here.
+
+
+# A réplica dos testes espelha o default (ver DATABASES no settings), então os dados
+# são os mesmos e dá pra conferir em qual conexão cada query foi parar.
+# TransactionTestCase porque o TestCase roda tudo num atomic, e dentro de atomic o
+# roteador manda tudo pro default de propósito.
+class ReplicaRouterTests(TransactionTestCase):
+    databases = {"default", REPLICA}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="ana", password="x", email="ana@exemplo.com", moedas=10)
+        PostRuido.objects.create(user=self.user, local_latitude=-23.5, local_longitude=-46.6, decibeis=60)
+        self.icone = Icone.objects.create(titulo="Árvore", descricao="", preco=5)
+        self.client = APIClient()
+
+    def _queries(self, requisicao):
+        with CaptureQueriesContext(connections["default"]) as default, \
+                CaptureQueriesContext(connections[REPLICA]) as replica:
+            resposta = requisicao()
+            if resposta.streaming:
+                b"".join(resposta.streaming_content)
+        return resposta, len(default), len(replica)
+
+    def test_leituras_vao_pra_replica(self):
+        for url in (
+            "/api/posts_ruido/",
+            f"/api/usuarios/{self.user.pk}/",
+            "/api/usuarios/ranking/",
+        ):
+            with self.subTest(url=url):
+                resposta, no_default, na_replica = self._queries(lambda: self.client.get(url))
+                self.assertEqual(resposta.status_code, 200)
+                self.assertEqual(no_default, 0)
+                self.assertGreater(na_replica, 0)
+
+    def test_compra_fica_no_default(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+        resposta, no_default, na_replica = self._queries(
+            lambda: self.client.post(f"/api/icones/{self.icone.pk}/comprar/")
+        )
+        self.assertEqual(resposta.status_code, 200)
+        self.assertGreater(no_default, 0)
+        self.assertEqual(na_replica, 0)
+
+    def test_atomic_le_do_default(self):
+        with leitura_na_replica():
+            self.assertEqual(User.objects.all().db, REPLICA)
+            with transaction.atomic():
+                self.assertEqual(User.objects.all().db, "default")
+
+
+class ArquivarLeiturasTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="ana", password="x", email="ana@exemplo.com")
+        antigo = timezone.localdate() - timedelta(days=settings.ARQUIVO_RETENCAO_DIAS + 10)
+
+        # duas leituras antigas na mesma célula, uma delas já agrupada (3 amostras)
+        self.agrupada = PostRuido.objects.create(
+            user=self.user, local_latitude=-23.5001, local_longitude=-46.6001,
+            decibeis=60, decibeis_max=70, amostras=3,
+        )
+        self.simples = PostRuido.objects.create(
+            user=self.user, local_latitude=-23.5002, local_longitude=-46.6002, decibeis=40,
+        )
+        # Post comum (sem ruído) também sai do banco, mas não entra no resumo
+        self.post_comum = Post.objects.create(user=self.user, local_latitude=-23.5, local_longitude=-46.6)
+        antigos = [self.agrupada.pk, self.simples.pk, self.post_comum.pk]
+        Post.objects.filter(pk__in=antigos).update(local_data=antigo)
+        self.antigo = antigo
+
+        self.recente = PostRuido.objects.create(
+            user=self.user, local_latitude=-23.5, local_longitude=-46.6, decibeis=55,
+        )
+
+    def _arquivar(self, destino, **opcoes):
+        call_command("arquivar_leituras", destino=destino, stdout=io.StringIO(), **opcoes)
+
+    def test_arquiva_resume_e_apaga_so_as_antigas(self):
+        with tempfile.TemporaryDirectory() as destino:
+            self._arquivar(destino, lote=2)
+
+            arquivos = os.listdir(destino)
+            self.assertEqual(len(arquivos), 1)
+            self.assertTrue(arquivos[0].endswith(".csv.gz"))
+            with gzip.open(os.path.join(destino, arquivos[0]), "rt", newline="") as arquivo:
+                linhas = list(csv.reader(arquivo))
+
+        dia = self.antigo.isoformat()
+        self.assertEqual(linhas, [
+            ["id", "user_id", "local_latitude", "local_longitude", "local_data",
+             "decibeis", "decibeis_max", "amostras"],
+            [str(self.agrupada.pk), str(self.user.pk), "-23.5001", "-46.6001", dia, "60.0", "70.0", "3"],
+            [str(self.simples.pk), str(self.user.pk), "-23.5002", "-46.6002", dia, "40.0", "40.0", "1"],
+            [str(self.post_comum.pk), str(self.user.pk), "-23.5", "-46.6", dia, "", "", ""],
+        ])
+
+        celula_lat, celula_lon = celula(-23.5001, -46.6001)
+        agregada = LeituraRuidoAgregada.objects.get()
+        self.assertEqual(
+            (agregada.dia, agregada.celula_lat, agregada.celula_lon),
+            (self.antigo, celula_lat, celula_lon),
+        )
+        # a agrupada pesa pelas 3 amostras: 60 * 3 + 40
+        self.assertEqual(agregada.amostras, 4)
+        self.assertAlmostEqual(agregada.soma_decibeis, 220)
+        self.assertEqual(agregada.max_decibeis, 70)
+
+        self.assertEqual(list(Post.objects.values_list("pk", flat=True)), [self.recente.pk])
+
+    def test_lote_invalido_nao_mexe_em_nada(self):
+        with tempfile.TemporaryDirectory() as destino:
+            with self.assertRaises(CommandError):
+                self._arquivar(destino, lote=0)
+            self.assertEqual(os.listdir(destino), [])
+        self.assertEqual(Post.objects.count(), 4)
+
+    def test_sem_leituras_antigas_nao_cria_arquivo(self):
+        Post.objects.exclude(pk=self.recente.pk).delete()
+        with tempfile.TemporaryDirectory() as destino:
+            self._arquivar(destino)
+            self.assertEqual(os.listdir(destino), [])
+        self.assertEqual(Post.objects.count(), 1)
+
+
+@override_settings(COALESCER_RAIO_METROS=25, COALESCER_JANELA_SEGUNDOS=60)
+class CoalescenciaTests(TestCase):
+    LAT, LON = -23.5, -46.6
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="ana", password="x", email="ana@exemplo.com")
+        self.leitura = PostRuido.objects.create(
+            user=self.user, local_latitude=self.LAT, local_longitude=self.LON, decibeis=50,
+        )
+
+    def test_media_pico_e_amostras(self):
+        agrupada = coalescer_leitura(self.user, self.LAT, self.LON, 60)
+        self.assertEqual(agrupada.pk, self.leitura.pk)
+        self.assertEqual((agrupada.decibeis, agrupada.decibeis_max, agrupada.amostras), (55, 60, 2))
+
+        # ~10 m ao norte, ainda dentro do raio
+        agrupada = coalescer_leitura(self.user, self.LAT + 0.00009, self.LON, 40)
+        self.assertEqual(agrupada.pk, self.leitura.pk)
+        self.assertAlmostEqual(agrupada.decibeis, (55 * 2 + 40) / 3)
+        self.assertEqual((agrupada.decibeis_max, agrupada.amostras), (60, 3))
+        self.assertEqual(PostRuido.objects.count(), 1)
+
+    def test_fora_do_raio(self):
+        # ~50 m ao norte
+        self.assertIsNone(coalescer_leitura(self.user, self.LAT + 0.00045, self.LON, 60))
+
+    def test_janela_conta_da_primeira_amostra(self):
+        agora = timezone.now()
+        # atualizada agora há pouco, mas a primeira amostra já saiu da janela
+        PostRuido.objects.filter(pk=self.leitura.pk).update(
+            primeira_amostra_em=agora - timedelta(seconds=61), atualizado_em=agora - timedelta(seconds=5),
+        )
+        self.assertIsNone(coalescer_leitura(self.user, self.LAT, self.LON, 60))
+
+    def test_so_agrupa_no_mesmo_dia(self):
+        Post.objects.filter(pk=self.leitura.pk).update(local_data=timezone.localdate() - timedelta(days=1))
+        self.assertIsNone(coalescer_leitura(self.user, self.LAT, self.LON, 60))
+
+    def test_so_agrupa_do_mesmo_usuario(self):
+        outro = User.objects.create_user(username="bia", password="x", email="bia@exemplo.com")
+        self.assertIsNone(coalescer_leitura(outro, self.LAT, self.LON, 60))
+
+    @override_settings(COALESCER_JANELA_SEGUNDOS=0)
+    def test_desligado(self):
+        self.assertIsNone(coalescer_leitura(self.user, self.LAT, self.LON, 60))
+
+    def test_save_recalcula_celula_e_pico(self):
+        self.leitura.local_latitude = self.leitura.local_longitude = 20
+        self.leitura.decibeis = 90
+        self.leitura.save()
+        self.leitura.refresh_from_db()
+        self.assertEqual(self.leitura.celula, chave_celula(20, 20))
+        self.assertEqual(self.leitura.decibeis_max, 90)
+
+        # agrupada: o pico fica, a menos que a nova média passe dele
+        PostRuido.objects.filter(pk=self.leitura.pk).update(amostras=3, decibeis_max=95)
+        self.leitura.refresh_from_db()
+        self.leitura.decibeis = 80
+        self.leitura.save()
+        self.assertEqual(self.leitura.decibeis_max, 95)
+        self.leitura.decibeis = 99
+        self.leitura.save()
+        self.assertEqual(self.leitura.decibeis_max, 99)
+
+
+class CompraIconeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="ana", password="x", email="ana@exemplo.com", moedas=10)
+        self.icone = Icone.objects.create(titulo="Árvore", descricao="d", preco=7)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _comprar(self, icone):
+        return self.client.post(f"/api/icones/{icone.pk}/comprar/")
+
+    def test_saldo_insuficiente_desfaz_a_compra(self):
+        caro = Icone.objects.create(titulo="Lago", descricao="d", preco=50)
+
+        resposta = self._comprar(caro)
+        self.assertEqual(resposta.status_code, 400)
+        self.assertEqual(resposta.data["detail"], "Saldo insuficiente!")
+        self.assertFalse(IconeComprado.objects.filter(user=self.user, icone=caro).exists())
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.moedas, 10)
+
+    def test_compra_repetida_nao_debita_de_novo(self):
+        self.assertEqual(self._comprar(self.icone).status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.moedas, 3)
+
+        # com saldo sobrando: quem barra é a unique_together, não o débito
+        User.objects.filter(pk=self.user.pk).update(moedas=20)
+        resposta = self._comprar(self.icone)
+        self.assertEqual(resposta.status_code, 400)
+        self.assertEqual(resposta.data["detail"], "Você já comprou esse ícone!")
+        self.assertEqual(IconeComprado.objects.filter(user=self.user, icone=self.icone).count(), 1)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.moedas, 20)
+
+
+class MaisProximosTests(TestCase):
+    PONTO = (-23.55, -46.63)
+    CANDIDATOS = [
+        (1, -23.551, -46.631),
+        (2, -23.56, -46.64),
+        (3, -23.5502, -46.6301),
+        (4, -23.70, -46.80),  # uns 25 km, fora do raio
+        (5, -23.549, -46.628),
+        (6, -23.555, -46.635),
+    ]
+
+    def _sem_numpy(self, *args):
+        # None em sys.modules faz o "import numpy" levantar ImportError
+        with mock.patch.dict(sys.modules, {"numpy": None}):
+            return mais_proximos(*args)
+
+    def test_python_puro_corta_por_raio_e_k(self):
+        resultado = self._sem_numpy(*self.PONTO, self.CANDIDATOS, 2, 3)
+        self.assertEqual([id_ for id_, _ in resultado], [3, 1, 5])
+        for id_, distancia in resultado:
+            _, lat, lon = next(c for c in self.CANDIDATOS if c[0] == id_)
+            self.assertAlmostEqual(distancia, haversine_km(*self.PONTO, lat, lon))
+
+        self.assertEqual([id_ for id_, _ in self._sem_numpy(*self.PONTO, self.CANDIDATOS, 2, 10)], [3, 1, 5, 6, 2])
+        self.assertEqual(self._sem_numpy(*self.PONTO, [], 2, 3), [])
+
+    @skipUnless(find_spec("numpy"), "NumPy não instalado")
+    def test_numpy_igual_ao_python_puro(self):
+        for raio_km, k in [(2, 3), (2, 10), (50, 10), (0.01, 5), (50, 1)]:
+            com_numpy = mais_proximos(*self.PONTO, self.CANDIDATOS, raio_km, k)
+            sem_numpy = self._sem_numpy(*self.PONTO, self.CANDIDATOS, raio_km, k)
+            self.assertEqual([id_ for id_, _ in com_numpy], [id_ for id_, _ in sem_numpy])
+            for (_, d1), (_, d2) in zip(com_numpy, sem_numpy):
+                self.assertAlmostEqual(d1, d2, places=9)
+            self.assertTrue(all(isinstance(id_, int) and isinstance(d, float) for id_, d in com_numpy))
+
+
+class EstatisticasTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="ana", password="x", email="ana@exemplo.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _postar(self, latitude, decibeis):
+        resposta = self.client.post("/api/posts_ruido/", {
+            "user": self.user.pk, "local_latitude": latitude, "local_longitude": -46.6, "decibeis": decibeis,
+        }, format="json")
+        self.assertEqual(resposta.status_code, 201)
+        return resposta.json()["post"]["id"]
+
+    def _estatisticas(self):
+        resposta = self.client.get(f"/api/usuarios/{self.user.pk}/estatisticas/")
+        dados = resposta.json()
+        return dados["total_leituras"], dados["media_decibeis"], dados["total_areas_verdes"]
+
+    def test_criar_editar_e_apagar(self):
+        primeiro = self._postar(-23.5, 60)
+        segundo = self._postar(-22.5, 40)
+        self.assertEqual(self._estatisticas(), (2, 50, 0))
+
+        resposta = self.client.put(f"/api/posts_ruido/{segundo}/", {
+            "user": self.user.pk, "local_latitude": -22.5, "local_longitude": -46.6, "decibeis": 80,
+        }, format="json")
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(self._estatisticas(), (2, 70, 0))
+
+        self.assertEqual(self.client.delete(f"/api/posts_ruido/{primeiro}/").status_code, 204)
+        self.assertEqual(self._estatisticas(), (1, 80, 0))
+
+        # apagar pelo posts/ (o Post pai) também desconta a leitura
+        self.assertEqual(self.client.delete(f"/api/posts/{segundo}/").status_code, 204)
+        self.assertEqual(self._estatisticas(), (0, None, 0))
+
+    def test_leitura_agrupada_desconta_todas_as_amostras(self):
+        leitura = PostRuido.objects.create(
+            user=self.user, local_latitude=-23.5, local_longitude=-46.6, decibeis=60, amostras=3,
+        )
+        for decibeis in (50, 60, 70):
+            registrar_post(self.user, decibeis=decibeis)
+        self.client.delete(f"/api/posts_ruido/{leitura.pk}/")
+        self.assertEqual(self._estatisticas(), (0, None, 0))
+        self.assertEqual(EstatisticasUsuario.objects.get().soma_decibeis, 0)
+
+    def test_area_verde_apagada(self):
+        area = PostAreaVerde.objects.create(
+            user=self.user, local_latitude=-23.5, local_longitude=-46.6,
+            titulo="Praça", modo_acesso="livre", imagem_nome="praca.jpg",
+        )
+        registrar_post(self.user, area_verde=True)
+        self.assertEqual(self._estatisticas(), (0, None, 1))
+        self.assertEqual(self.client.delete(f"/api/posts_areas/{area.pk}/").status_code, 204)
+        self.assertEqual(self._estatisticas(), (0, None, 0))
+
+
+@override_settings(LIMITES_ESCRITA={
+    "posts": {"usuario": ("1/h", 5), "ip": ("1/h", 2)},
+    "compras": {"usuario": ("1/h", 5), "ip": ("1/h", 5)},
+})
+class LimiteEscritaTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="ana", password="x", email="ana@exemplo.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _postar(self, latitude):
+        return self.client.post("/api/posts_ruido/", {
+            "user": self.user.pk, "local_latitude": latitude, "local_longitude": -46.6, "decibeis": 50,
+        }, format="json")
+
+    def _fichas_usuario(self):
+        return cache.get(f"balde:posts:usuario:{self.user.pk}")[0]
+
+    def test_ip_recusa_sem_gastar_o_balde_do_usuario(self):
+        self.assertEqual(self._postar(-23.5).status_code, 201)
+        self.assertEqual(self._postar(-22.5).status_code, 201)
+
+        resposta = self._postar(-21.5)
+        self.assertEqual(resposta.status_code, 429)
+        # falta quase uma hora pra próxima ficha do IP (1/h)
+        self.assertGreater(int(resposta["Retry-After"]), 3500)
+        self.assertEqual(PostRuido.objects.count(), 2)
+        # só as duas requests aceitas gastaram do balde do usuário
+        self.assertAlmostEqual(self._fichas_usuario(), 3, places=2)
+
+    @override_settings(LIMITES_ESCRITA={"posts": {"usuario": ("1/h", 1), "ip": ("1/h", 10)}})
+    def test_usuario_recusa(self):
+        self.assertEqual(self._postar(-23.5).status_code, 201)
+        resposta = self._postar(-22.5)
+        self.assertEqual(resposta.status_code, 429)
+        self.assertIn("Retry-After", resposta)
+
+    def test_leitura_nao_gasta_ficha(self):
+        for _ in range(3):
+            self.assertEqual(self.client.get("/api/posts_ruido/").status_code, 200)
+        self.assertIsNone(cache.get(f"balde:posts:usuario:{self.user.pk}"))
@@ -0,0 +1,128 @@
+import time
+from typing import NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+DURACOES = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+class _Estado(NamedTuple):
+    chave: str
+    fichas: float
+    agora: float
+    taxa: float
+    rajada: int
+
+
+def ler_taxa(taxa: str) -> float:
+    """``"20/min"`` -> fichas por segundo (mesmo formato das taxas do DRF)."""
+
+    quantidade, periodo = taxa.split("/")
+    return int(quantidade) / DURACOES[periodo[0]]
+
+
+class _BaldeThrottle(BaseThrottle):
+    """Token bucket guardado no cache do Django: O(1) por checagem.
+
+    O balde enche ``taxa`` fichas por segundo até ``rajada``; cada request gasta
+    uma. A configuração vem de ``settings.LIMITES_ESCRITA[view.throttle_scope]``.
+    A leitura e a gravação no cache não são atômicas, então com muitas requests
+    simultâneas do mesmo cliente algumas a mais podem passar.
+    """
+
+    tipo = None  # "usuario" ou "ip"
+
+    def chave(self, request) -> Optional[str]:
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        self.espera = None
+        estado = self.consultar(request, view)
+        if estado is None:
+            return True
+        if estado.fichas < 1:
+            self.espera = self.guardar(estado, gastar=False)
+            return False
+        self.guardar(estado, gastar=True)
+        return True
+
+    def consultar(self, request, view) -> Optional["_Estado"]:
+        """Lê o balde do cliente (já recarregado até agora) sem gastar nada."""
+
+        escopo = getattr(view, "throttle_scope", None)
+        identificador = self.chave(request)
+        if escopo is None or identificador is None:
+            return None
+
+        taxa, rajada = self._limite(escopo)
+        chave = f"balde:{escopo}:{self.tipo}:{identificador}"
+        agora = time.time()
+
+        fichas, atualizado_em = cache.get(chave, (rajada, agora))
+        fichas = min(rajada, fichas + (agora - atualizado_em) * taxa)
+        return _Estado(chave, fichas, agora, taxa, rajada)
+
+    def guardar(self, estado: "_Estado", gastar: bool) -> Optional[float]:
+        """Grava o balde (gastando uma ficha ou não); sem gastar, devolve a espera em segundos."""
+
+        # a entrada some sozinha quando o balde já estaria cheio de novo
+        expira = int(estado.rajada / estado.taxa) + 1
+        fichas = estado.fichas - 1 if gastar else estado.fichas
+        cache.set(estado.chave, (fichas, estado.agora), expira)
+        return None if gastar else (1 - estado.fichas) / estado.taxa
+
+    def wait(self):
+        return self.espera
+
+    def _limite(self, escopo) -> Tuple[float, int]:
+        taxa, rajada = settings.LIMITES_ESCRITA[escopo][self.tipo]
+        return ler_taxa(taxa), rajada
+
+
+class BaldeUsuarioThrottle(_BaldeThrottle):
+    tipo = "usuario"
+
+    def chave(self, request):
+        user = getattr(request, "user", None)
+        if user is None or not user.is_authenticated:
+            return None
+        return str(user.pk)
+
+
+class BaldeIpThrottle(_BaldeThrottle):
+    tipo = "ip"
+
+    def chave(self, request):
+        return self.get_ident(request)
+
+
+class BaldeEscritaThrottle(BaseThrottle):
+    """Os baldes por usuário e por IP juntos.
+
+    Só gasta ficha se todos os baldes tiverem uma: com dois throttles separados
+    o DRF gastaria a do usuário mesmo quando o do IP recusa a request.
+    """
+
+    baldes = (BaldeUsuarioThrottle, BaldeIpThrottle)
+
+    def allow_request(self, request, view):
+        self.espera = None
+        estados = []
+        for classe in self.baldes:
+            balde = classe()
+            estado = balde.consultar(request, view)
+            if estado is not None:
+                estados.append((balde, estado))
+
+        if any(estado.fichas < 1 for _, estado in estados):
+            self.espera = max(balde.guardar(estado, gastar=False) for balde, estado in estados)
+            return False
+
+        for balde, estado in estados:
+            balde.guardar(estado, gastar=True)
+        return True
+
+    def wait(self):
+        return self.espera
@@ -1,5 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from . import async_views
 from .cron_views import reset_streaks_cron
 from .views import (
     UserViewSet,
@@ -23,5 +24,10 @@ urlpatterns = [
     path('', include(router.urls)),
     path('current_user/', CurrentUserView.as_view(), name='current_user'),
 
+    # leituras do mapa em views async (ASGI)
+    path('async/mapa_calor/', async_views.mapa_calor, name='async_mapa_calor'),
+    path('async/posts_areas/', async_views.areas_verdes, name='async_areas_verdes'),
+    path('async/ranking/', async_views.ranking, name='async_ranking'),
+
     path('cron/reset-streaks/', reset_streaks_cron, name='reset_streaks_cron'),
 ]
\ No newline at end of file
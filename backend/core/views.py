@@ -1,68 +1,196 @@
+import math
+
 from django.shortcuts import render
 from rest_framework import viewsets
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, IsAuthenticatedOrReadOnly
 from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
 from django.db import transaction, IntegrityError
-from .models import User, Icone, IconeComprado, Post, PostRuido, PostAreaVerde
+from django.db.models import F
+from django.http import Http404, StreamingHttpResponse
+from django.utils.dateparse import parse_date
+from itertools import chain
+from .authentication import invalidar_usuario_cache
+from .db_router import leitura_na_replica
+from .models import User, Icone, IconeComprado, Post, PostRuido, PostAreaVerde, EstatisticasUsuario
 from .serializers import (
     UserSerializer,
+    EstatisticasUsuarioSerializer,
     IconeSerializer,
     IconeCompradoSerializer,
     PostSerializer,
     PostRuidoSerializer,
     PostAreaVerdeSerializer,
 )
+from .services.catalogo_icones import listar_icones, obter_icone
+from .services.clusters import clusters_areas_verdes, tiles_no_bbox
+from .services.coalescencia import coalescer_leitura
+from .services.estatisticas import ajustar_estatisticas, contribuicao, registrar_post
+from .services.exportacao import (
+    COLUNAS_LEITURA_RUIDO,
+    CONTENT_TYPES,
+    FORMATOS_EXPORTACAO,
+    extensao,
+    gerar_bytes,
+    iterar_em_lotes,
+    leituras_ruido,
+)
+from .pagination import PaginacaoProximas
+from .services.geo import caixa_ao_redor, ler_bbox, mais_proximos
+from .streaming import (
+    CAMPOS_AREA_VERDE,
+    CAMPOS_POST_RUIDO,
+    CAMPOS_USUARIO,
+    area_verde_para_dict,
+    post_ruido_para_dict,
+    resposta_json_streaming,
+    resposta_mapa_calor,
+    usuario_para_dict,
+)
+from .throttling import BaldeEscritaThrottle
 # Create your views here.
 
-class UserViewSet(viewsets.ModelViewSet):
+MAX_PROXIMAS = 100
+SEM_RECOMPENSA = {"aumentou_streak": False, "moedas_ganhas": 0}
+MAX_RAIO_KM = 50
+
+
+def _parametro_numerico(request, nome, tipo, padrao=None, minimo=None, maximo=None):
+    valor = request.query_params.get(nome)
+    if valor in (None, ""):
+        if padrao is None:
+            raise ValidationError({nome: "Parâmetro obrigatório."})
+        return padrao
+    try:
+        valor = tipo(valor)
+    except ValueError as exc:
+        raise ValidationError({nome: "Valor inválido."}) from exc
+    # nan passaria pelas comparações abaixo (toda comparação com nan é falsa)
+    if not math.isfinite(valor):
+        raise ValidationError({nome: "Valor inválido."})
+    if (minimo is not None and valor < minimo) or (maximo is not None and valor > maximo):
+        raise ValidationError({nome: f"Deve estar entre {minimo} e {maximo}."})
+    return valor
+
+
+class LeituraReplicaMixin:
+    """Executa as ações listadas em ``acoes_replica`` lendo da réplica (se houver uma configurada)."""
+
+    acoes_replica = ("list", "retrieve")
+
+    def dispatch(self, request, *args, **kwargs):
+        acao = self.action_map.get(request.method.lower())
+        if acao not in self.acoes_replica:
+            return super().dispatch(request, *args, **kwargs)
+        with leitura_na_replica():
+            return super().dispatch(request, *args, **kwargs)
+
+
+class LimiteCriacaoMixin:
+    """Aplica os token buckets de escrita (por usuário e por IP) só no ``create``."""
+
+    throttle_scope = "posts"
+
+    def get_throttles(self):
+        if self.action == "create":
+            return [BaldeEscritaThrottle()]
+        return super().get_throttles()
+
+
+class EstatisticasPostMixin:
+    """Mantém ``EstatisticasUsuario`` certo quando um post é editado ou apagado.
+
+    O create de cada viewset já chama ``registrar_post``.
+    """
+
+    def perform_update(self, serializer):
+        dono_antes = serializer.instance.user_id
+        antes = contribuicao(serializer.instance)
+        with transaction.atomic():
+            post = serializer.save()
+            depois = contribuicao(post)
+            if post.user_id == dono_antes:
+                ajustar_estatisticas(dono_antes, antes, depois)
+            else:
+                ajustar_estatisticas(dono_antes, antes=antes)
+                ajustar_estatisticas(post.user_id, depois=depois)
+
+    def perform_destroy(self, instance):
+        dono, antes = instance.user_id, contribuicao(instance)
+        with transaction.atomic():
+            instance.delete()
+            ajustar_estatisticas(dono, antes=antes)
+
+
+class UserViewSet(LeituraReplicaMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    acoes_replica = ("list", "retrieve", "ranking", "estatisticas")
 
     # User ordenado pro ranking lmao
     @action (detail=False, methods=["get"])
     def ranking(self, request):
         ranking = User.objects.all().order_by('-streak')
-        serializer = self.get_serializer(ranking, many=True)
-        return Response(serializer.data)
+        return resposta_json_streaming(ranking, CAMPOS_USUARIO, usuario_para_dict)
 
-class IconeViewSet(viewsets.ModelViewSet):
+    # Estatísticas do perfil: GET /api/usuarios/pk/estatisticas/ (uma leitura por chave primária)
+    @action (detail=True, methods=["get"])
+    def estatisticas(self, request, pk=None):
+        # o get_object_or_404 do DRF também dá 404 pra pk que não é número
+        try:
+            estatisticas = get_object_or_404(EstatisticasUsuario.objects.all(), user_id=pk)
+        except Http404:
+            # usuário que ainda não postou nada (ou não existe, aí o get_object dá 404)
+            estatisticas = EstatisticasUsuario(user=self.get_object())
+        return Response(EstatisticasUsuarioSerializer(estatisticas).data)
+
+class IconeViewSet(LeituraReplicaMixin, viewsets.ModelViewSet):
     queryset = Icone.objects.all()
     serializer_class = IconeSerializer
+    throttle_scope = "compras"
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_serializer(listar_icones(), many=True)
+        return Response(serializer.data)
 
     # Vai criar o endpoint para mostrar apenas os ícones não comprados pelo usuário na loja!
     @action (detail=False, methods=["get"], permission_classes=[IsAuthenticated])
     def disponiveis(self, request):
-        ids_comprados = IconeComprado.objects.filter(user=request.user).values_list("icone_id", flat=True)
-        qs = Icone.objects.exclude(id__in=ids_comprados)
-        serializer = self.get_serializer(qs, many=True)
+        ids_comprados = set(IconeComprado.objects.filter(user=request.user).values_list("icone_id", flat=True))
+        icones = [icone for icone in listar_icones() if icone.id not in ids_comprados]
+        serializer = self.get_serializer(icones, many=True)
         return Response(serializer.data)
 
     # Action de compra: vai criar o endpoint POST  /api/icones/pk/comprar
-    @action (detail=True, methods=["post"], permission_classes=[IsAuthenticated])
+    @action (detail=True, methods=["post"], permission_classes=[IsAuthenticated],
+             throttle_classes=[BaldeEscritaThrottle])
     def comprar(self, request, pk=None):
-        icone = self.get_object()
+        icone = obter_icone(pk)
+        if icone is None:
+            raise Http404
         user = request.user
 
+        # Sem select_for_update: a unique_together barra a compra repetida e o débito é um
+        # UPDATE condicional, então compras simultâneas não ficam esperando o lock do usuário.
         try:
             with transaction.atomic():
-                # perez core: bloqueia o usuário e evita condição de corrida
-                user_locked = User.objects.select_for_update().get(pk=user.pk)
-
-                if IconeComprado.objects.filter(user=user_locked, icone=icone).exists():
-                    return Response({"detail": "Você já comprou esse ícone!"}, status=400)
+                IconeComprado.objects.create(user_id=user.pk, icone=icone)
 
-                if user_locked.moedas < icone.preco:
+                debitado = User.objects.filter(pk=user.pk, moedas__gte=icone.preco).update(
+                    moedas=F("moedas") - icone.preco
+                )
+                if not debitado:
+                    transaction.set_rollback(True)
                     return Response({"detail": "Saldo insuficiente!"}, status=400)
 
-                user_locked.moedas -= icone.preco
-                user_locked.save()
-
-                IconeComprado.objects.create(user=user_locked, icone=icone)
+                # o update não dispara post_save, então limpa o usuário do cache da autenticação
+                transaction.on_commit(lambda: invalidar_usuario_cache(user.pk))
 
         except IntegrityError:
-            return Response({"detail": "Erro ao processar a compra! Tente novamente."}, status=400)
+            return Response({"detail": "Você já comprou esse ícone!"}, status=400)
 
         return Response({"detail": "Compra realizada com sucesso!"}, status=200)
 
@@ -78,7 +206,7 @@ class IconeCompradoViewSet(viewsets.ModelViewSet):
 
 
 
-class PostViewSet(viewsets.ModelViewSet):
+class PostViewSet(LimiteCriacaoMixin, EstatisticasPostMixin, LeituraReplicaMixin, viewsets.ModelViewSet):
     queryset = Post.objects.all()
     serializer_class = PostSerializer
 
@@ -88,29 +216,129 @@ class PostViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         post = serializer.save(user=user)
+        registrar_post(user)
 
         response_data = self.get_serializer(post).data
         return Response({"post": response_data, "recompensa": resultado_recompensa}, status=201)
 
 
-class PostRuidoViewSet(viewsets.ModelViewSet):
+class PostRuidoViewSet(LimiteCriacaoMixin, EstatisticasPostMixin, LeituraReplicaMixin, viewsets.ModelViewSet):
     queryset = PostRuido.objects.all()
     serializer_class = PostRuidoSerializer
+    acoes_replica = ("list", "retrieve", "exportar", "mapa_calor")
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return resposta_json_streaming(queryset, CAMPOS_POST_RUIDO, post_ruido_para_dict)
+
+    # Pontos do mapa de calor: GET /api/posts_ruido/mapa_calor/ -> {"points": [{latitude, longitude, weight}]}
+    # Inclui as leituras já arquivadas (média por célula e dia), que o list não tem.
+    @action (detail=False, methods=["get"])
+    def mapa_calor(self, request):
+        return resposta_mapa_calor(self.get_queryset().db)
+
+    # Exportação completa pra pesquisa: GET /api/posts_ruido/exportar/?formato=csv&bbox=&desde=&ate=
+    @action (detail=False, methods=["get"], permission_classes=[IsAdminUser])
+    def exportar(self, request):
+        formato = request.query_params.get("formato", "csv")
+        if formato not in FORMATOS_EXPORTACAO:
+            raise ValidationError({"formato": f"Use um de: {', '.join(FORMATOS_EXPORTACAO)}."})
+
+        filtros = {}
+        try:
+            if request.query_params.get("bbox"):
+                filtros["bbox"] = ler_bbox(request.query_params["bbox"])
+        except ValueError as exc:
+            raise ValidationError({"bbox": str(exc)}) from exc
+        for campo in ("desde", "ate"):
+            if request.query_params.get(campo):
+                filtros[campo] = parse_date(request.query_params[campo])
+                if filtros[campo] is None:
+                    raise ValidationError({campo: "Data inválida, use AAAA-MM-DD."})
+
+        queryset = self.get_queryset()
+        leituras = leituras_ruido(queryset=queryset.using(queryset.db), **filtros)
+        try:
+            conteudo = gerar_bytes(formato, COLUNAS_LEITURA_RUIDO, iterar_em_lotes(leituras))
+            # começa o gerador já aqui pra erro de dependência (pyarrow) virar 400, não resposta cortada
+            primeiro_pedaco = next(conteudo)
+        except RuntimeError as exc:
+            raise ValidationError({"formato": str(exc)}) from exc
+
+        resposta = StreamingHttpResponse(chain([primeiro_pedaco], conteudo), content_type=CONTENT_TYPES[formato])
+        resposta["Content-Disposition"] = f'attachment; filename="leituras_ruido{extensao(formato)}"'
+        return resposta
 
     def create(self, request, *args, **kwargs):
         user = request.user
-        resultado_recompensa = user.aplicar_recompensa()
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+        dados = serializer.validated_data
+
+        # leitura repetida no mesmo lugar: entra na média da anterior, sem nova recompensa
+        post = coalescer_leitura(user, dados["local_latitude"], dados["local_longitude"], dados["decibeis"])
+        if post is not None:
+            registrar_post(user, decibeis=dados["decibeis"])
+            response_data = self.get_serializer(post).data
+            return Response({"post": response_data, "recompensa": SEM_RECOMPENSA}, status=200)
+
+        resultado_recompensa = user.aplicar_recompensa()
         post = serializer.save(user=user)
+        registrar_post(user, decibeis=post.decibeis)
 
         response_data = self.get_serializer(post).data
         return Response({"post": response_data, "recompensa": resultado_recompensa}, status=201)
 
-class PostAreaVerdeViewSet(viewsets.ModelViewSet):
+class PostAreaVerdeViewSet(LimiteCriacaoMixin, EstatisticasPostMixin, LeituraReplicaMixin, viewsets.ModelViewSet):
     queryset = PostAreaVerde.objects.all()
     serializer_class = PostAreaVerdeSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    acoes_replica = ("list", "retrieve", "proximas", "clusters")
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return resposta_json_streaming(queryset, CAMPOS_AREA_VERDE, area_verde_para_dict)
+
+    # Áreas verdes mais perto: GET /api/posts_areas/nearby/?lat=&lon=&k=&radius= (radius em km)
+    @action (detail=False, methods=["get"], url_path="nearby", pagination_class=PaginacaoProximas)
+    def proximas(self, request):
+        latitude = _parametro_numerico(request, "lat", float, minimo=-90, maximo=90)
+        longitude = _parametro_numerico(request, "lon", float, minimo=-180, maximo=180)
+        k = _parametro_numerico(request, "k", int, padrao=20, minimo=1, maximo=MAX_PROXIMAS)
+        raio_km = _parametro_numerico(request, "radius", float, padrao=5, minimo=0, maximo=MAX_RAIO_KM)
+
+        # pré-filtro pelo índice (lat, lon) e ranking exato pela distância
+        min_lon, min_lat, max_lon, max_lat = caixa_ao_redor(latitude, longitude, raio_km)
+        candidatos = list(
+            self.get_queryset()
+            .filter(
+                local_latitude__range=(min_lat, max_lat),
+                local_longitude__range=(min_lon, max_lon),
+            )
+            .values_list("id", "local_latitude", "local_longitude")
+        )
+        ranking = mais_proximos(latitude, longitude, candidatos, raio_km, k)
+
+        pagina = self.paginate_queryset(ranking)
+        areas = self.get_queryset().in_bulk([id_ for id_, _ in pagina])
+        resultados = []
+        for id_, distancia in pagina:
+            dados = self.get_serializer(areas[id_]).data
+            dados["distancia_km"] = round(distancia, 3)
+            resultados.append(dados)
+        return self.get_paginated_response(resultados)
+
+    # Clusters pro mapa: GET /api/posts_areas/clusters/?zoom=&bbox=min_lon,min_lat,max_lon,max_lat
+    # Abaixo de CLUSTER_ZOOM_MARCADORES vêm só os clusters (count, centroide e uma área de exemplo);
+    # a partir dele vêm os marcadores individuais.
+    @action (detail=False, methods=["get"])
+    def clusters(self, request):
+        zoom = _parametro_numerico(request, "zoom", int, minimo=0, maximo=22)
+        try:
+            tiles = tiles_no_bbox(zoom, ler_bbox(request.query_params.get("bbox", "")))
+        except ValueError as exc:
+            raise ValidationError({"bbox": str(exc)}) from exc
+        return Response(clusters_areas_verdes(self.get_queryset(), zoom, tiles))
 
     def create(self, request, *args, **kwargs):
         user = request.user
@@ -118,6 +346,7 @@ class PostAreaVerdeViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         post = serializer.save(user=user)
+        registrar_post(user, area_verde=True)
 
         response_data = self.get_serializer(post).data
         return Response({"post": response_data, "recompensa": resultado_recompensa}, status=201)
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 from urllib.parse import urlparse
 
 import environ
@@ -68,8 +69,36 @@ AUTH_USER_MODEL = 'core.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.CachedJWTAuthentication',
     ),
+    # Proxies na frente do Django (usado pelo throttle por IP). Na Vercel é um só: o edge
+    # sobrescreve o X-Forwarded-For com o IP real do cliente, então o header mandado pelo
+    # cliente não conta. Rodando sem proxy nenhum, use NUM_PROXIES=0 (aí vale o REMOTE_ADDR).
+    'NUM_PROXIES': env.int('NUM_PROXIES', default=1),
+}
+
+# Cache compartilhado (usuário autenticado, etc). Sem CACHE_URL fica em memória no processo;
+# com várias instâncias, aponte pra um Redis/Memcached, ex.: CACHE_URL=redis://host:6379/0
+CACHES = {
+    'default': env.cache_url('CACHE_URL', default='locmemcache://'),
+}
+
+# Por quanto tempo (s) o usuário do token JWT fica em cache. Só liga por padrão com um cache
+# compartilhado: em memória cada instância teria a sua cópia e a invalidação não chegaria nas outras.
+CACHE_COMPARTILHADO = not CACHES['default']['BACKEND'].endswith('LocMemCache')
+JWT_USUARIO_CACHE_TTL = env.int('JWT_USUARIO_CACHE_TTL', default=60 if CACHE_COMPARTILHADO else 0)
+
+# Token bucket das escritas (core.throttling): escopo -> tipo -> (taxa de recarga, rajada).
+# O limite por IP é mais folgado porque operadoras móveis põem muita gente atrás do mesmo IP.
+LIMITES_ESCRITA = {
+    'posts': {
+        'usuario': (env('LIMITE_POSTS_USUARIO', default='20/min'), env.int('RAJADA_POSTS_USUARIO', default=10)),
+        'ip': (env('LIMITE_POSTS_IP', default='120/min'), env.int('RAJADA_POSTS_IP', default=60)),
+    },
+    'compras': {
+        'usuario': (env('LIMITE_COMPRAS_USUARIO', default='10/min'), env.int('RAJADA_COMPRAS_USUARIO', default=5)),
+        'ip': (env('LIMITE_COMPRAS_IP', default='60/min'), env.int('RAJADA_COMPRAS_IP', default=30)),
+    },
 }
 
 
@@ -121,6 +150,11 @@ DATABASES = {
     }
 }
 
+# Conexões persistentes: reaproveita a conexão entre requests em vez de abrir uma nova toda vez.
+# Com POSTGRES_POOL=True usa o pool do psycopg 3 (psycopg[pool], no requirements) e aí CONN_MAX_AGE fica 0.
+CONN_MAX_AGE = env.int('CONN_MAX_AGE', default=60)
+POSTGRES_POOL = env.bool('POSTGRES_POOL', default=False)
+
 POSTGRES_DATABASE = os.environ.get('POSTGRES_DATABASE')
 if POSTGRES_DATABASE:
     DATABASES['default'] = {
@@ -130,7 +164,32 @@ if POSTGRES_DATABASE:
         'PASSWORD': os.environ.get('POSTGRES_PASSWORD'),
         'HOST': os.environ.get('POSTGRES_HOST'),
         'PORT': '5432',
+        'CONN_MAX_AGE': 0 if POSTGRES_POOL else CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
     }
+    if POSTGRES_POOL:
+        DATABASES['default']['OPTIONS'] = {
+            'pool': {
+                'min_size': env.int('POSTGRES_POOL_MIN', default=1),
+                'max_size': env.int('POSTGRES_POOL_MAX', default=10),
+            },
+        }
+
+    # Réplica de leitura opcional (mesmo banco/usuário, outro host)
+    POSTGRES_REPLICA_HOST = os.environ.get('POSTGRES_REPLICA_HOST')
+    if POSTGRES_REPLICA_HOST:
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'HOST': POSTGRES_REPLICA_HOST,
+            'TEST': {'MIRROR': 'default'},
+        }
+
+# Nos testes sempre existe uma "réplica" espelhando o default (TEST MIRROR: mesma base de teste),
+# pra o core.tests conferir o roteamento sem precisar de um segundo banco de verdade.
+if sys.argv[1:2] == ['test'] and 'replica' not in DATABASES:
+    DATABASES['replica'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
 
 
 # Password validation
@@ -181,6 +240,28 @@ SUPABASE_PUBLIC_URL = env(
     default=(f"{SUPABASE_URL.rstrip('/')}" + "/storage/v1/object/public") if SUPABASE_URL else "",
 )
 
+# Por quanto tempo (s) cada processo reaproveita o catálogo de ícones em memória
+ICONES_CACHE_TTL = env.int("ICONES_CACHE_TTL", default=300)
+
+# Linhas buscadas por vez do cursor nas listagens em streaming
+STREAMING_CHUNK_SIZE = env.int("STREAMING_CHUNK_SIZE", default=2000)
+
+# Leituras de ruído do mesmo usuário a menos de X metros e Y segundos uma da outra viram uma linha só.
+# O raio precisa ser menor que uma célula da grade (~100 m); 0 em qualquer um desliga o agrupamento.
+COALESCER_RAIO_METROS = env.float("COALESCER_RAIO_METROS", default=25)
+COALESCER_JANELA_SEGUNDOS = env.int("COALESCER_JANELA_SEGUNDOS", default=60)
+
+# Clusters de áreas verdes (posts_areas/clusters/): a partir desse zoom vêm os marcadores individuais.
+# Os tiles calculados ficam no cache por CLUSTER_CACHE_TTL segundos ou até alguém criar/apagar uma área.
+# Essa invalidação só chega nas outras instâncias com cache compartilhado; em memória cada instância
+# pode mostrar tiles velhos até o TTL vencer, por isso o padrão é bem mais curto sem CACHE_URL.
+CLUSTER_ZOOM_MARCADORES = env.int("CLUSTER_ZOOM_MARCADORES", default=15)
+CLUSTER_CACHE_TTL = env.int("CLUSTER_CACHE_TTL", default=600 if CACHE_COMPARTILHADO else 30)
+
+# Arquivamento das leituras antigas (manage.py arquivar_leituras)
+ARQUIVO_RETENCAO_DIAS = env.int("ARQUIVO_RETENCAO_DIAS", default=180)
+ARQUIVO_LEITURAS_DIR = env("ARQUIVO_LEITURAS_DIR", default=str(BASE_DIR / "arquivo"))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 